@@ -1,11 +1,20 @@
 import os
+import threading
+from functools import lru_cache
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import librosa
 import librosa.display
 import numpy as np
 import scipy.signal
+from voiceauth.audio import DEFAULT_SAMPLE_RATE
+
+# Histogram layout shared by the PNG path and the in-memory renderer
+HISTOGRAM_BINS = 256
+HISTOGRAM_RANGE = (-1, 1)
 
 def ensure_output_directory(dir_name):
     """
@@ -17,7 +26,7 @@ def ensure_output_directory(dir_name):
     if not os.path.exists(dir_name):
         os.makedirs(dir_name)
 
-def load_audio(file_path, sr=44100):
+def load_audio(file_path, sr=DEFAULT_SAMPLE_RATE):
     """
     Load an audio file with the specified sample rate.
     
@@ -31,6 +40,23 @@ def load_audio(file_path, sr=44100):
     audio, sr = librosa.load(file_path, sr=sr)
     return audio, sr
 
+@lru_cache(maxsize=32)
+def lowpass_coefficients(cutoff_frequency, sr, order=4):
+    """
+    Butterworth low-pass coefficients, computed once per cutoff and sample rate.
+    
+    Args:
+        cutoff_frequency (float): Cutoff frequency for the low-pass filter.
+        sr (int): Sample rate of the audio.
+        order (int): Filter order.
+        
+    Returns:
+        tuple: Numerator (b) and denominator (a) polynomials.
+    """
+    nyquist_frequency = sr / 2
+    cutoff_normalized = float(cutoff_frequency) / nyquist_frequency
+    return scipy.signal.butter(order, cutoff_normalized, btype='low')
+
 def filter_audio(audio_data, cutoff_frequency, sr):
     """
     Apply a low-pass filter to the audio data.
@@ -43,11 +69,7 @@ def filter_audio(audio_data, cutoff_frequency, sr):
     Returns:
         np.ndarray: Filtered audio data.
     """
-    cutoff_frequency = float(cutoff_frequency)
-    
-    nyquist_frequency = sr / 2
-    cutoff_normalized = cutoff_frequency / nyquist_frequency
-    b, a = scipy.signal.butter(4, cutoff_normalized, btype='low')
+    b, a = lowpass_coefficients(float(cutoff_frequency), sr)
     filtered_audio = scipy.signal.filtfilt(b, a, audio_data)
     return filtered_audio
 
@@ -84,7 +106,7 @@ def compute_histogram(filtered_audio, file_name, output_dir):
         str: Path to the saved histogram image.
     """
     ensure_output_directory(output_dir)
-    hist, bins = np.histogram(filtered_audio, bins=256, range=(-1, 1))
+    hist, bins = np.histogram(filtered_audio, bins=HISTOGRAM_BINS, range=HISTOGRAM_RANGE)
     plt.figure()
     plt.bar(bins[:-1], hist, width=(bins[1] - bins[0]), color='black')
     save_path = os.path.join(output_dir, f"hist_{file_name}.png")
@@ -92,6 +114,129 @@ def compute_histogram(filtered_audio, file_name, output_dir):
     plt.close()
     return save_path
 
+class _HistogramCanvas:
+    """
+    Off-screen replica of the figure drawn by compute_histogram.
+
+    The static parts of the chart (figure background, x-axis) are rendered
+    once and blitted back on every call. Only the y-axis and spines, which
+    depend on the tallest bar, are redrawn by matplotlib; the bars themselves
+    are pixel-snapped rectangles and are filled directly with numpy, exactly
+    as the Agg renderer rasterizes them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.figure = Figure()
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+
+        # Let matplotlib autoscale the x-axis from the fixed bin layout once
+        bins = np.histogram_bin_edges([], bins=HISTOGRAM_BINS, range=HISTOGRAM_RANGE)
+        self.width = bins[1] - bins[0]
+        self.left = bins[:-1] - self.width / 2
+        bars = self.ax.bar(bins[:-1], np.ones(HISTOGRAM_BINS), width=self.width, color='black')
+        self.ax.set_xlim(self.ax.get_xlim())
+        bars.remove()
+
+        # Background without the artists that change between calls
+        self.dynamic = [self.ax.yaxis, *self.ax.spines.values()]
+        for artist in self.dynamic:
+            artist.set_visible(False)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        for artist in self.dynamic:
+            artist.set_visible(True)
+
+    def _ylim(self, peak):
+        """Replicate Axes.autoscale_view for bars spanning [0, peak] with a sticky edge at 0."""
+        y0, y1 = self.ax.yaxis.get_major_locator().nonsingular(0.0, float(peak))
+        _, margin = self.ax.margins()
+        tol = 1e-5 * abs(y1 - y0)
+        delta = (y1 - y0) * margin
+        lower, upper = y0 - delta, y1 + delta
+        if 0 < y0 + tol:
+            lower = max(lower, 0.0)
+        if 0 > y1 - tol:
+            upper = min(upper, 0.0)
+        return lower, upper
+
+    def render(self, hist):
+        """Render histogram counts to an RGB uint8 array identical to the saved PNG."""
+        with self.lock:
+            self.ax.set_ylim(*self._ylim(hist.max()))
+            self.canvas.restore_region(self.background)
+            for artist in self.dynamic:
+                self.ax.draw_artist(artist)
+            image = np.array(self.canvas.buffer_rgba())[..., :3]
+
+            # Agg snaps edge-less rectangles to whole pixels in device space
+            x = self.ax.transData.transform(
+                np.column_stack([np.r_[self.left, self.left + self.width], np.zeros(2 * HISTOGRAM_BINS)]))[:, 0]
+            y = self.ax.transData.transform(
+                np.column_stack([np.zeros(HISTOGRAM_BINS + 1), np.r_[0.0, hist]]))[:, 1]
+
+        height = image.shape[0]
+        x = np.floor(x + 0.5).astype(int)
+        y = np.floor(height - y + 0.5).astype(int)
+        x0, x1 = x[:HISTOGRAM_BINS], x[HISTOGRAM_BINS:]
+        bottom, top = y[0], y[1:]
+        for i in np.flatnonzero((top < bottom) & (x0 < x1)):
+            image[top[i]:bottom, x0[i]:x1[i]] = 0
+        return image
+
+_histogram_canvas = None
+_histogram_canvas_lock = threading.Lock()
+
+def render_histogram(filtered_audio):
+    """
+    Render the histogram of filtered audio data in memory.
+
+    Produces the same pixels as the PNG written by compute_histogram, without
+    creating a pyplot figure or touching the filesystem.
+
+    Args:
+        filtered_audio (np.ndarray): Filtered audio data.
+
+    Returns:
+        np.ndarray: RGB image of shape (height, width, 3) and dtype uint8.
+    """
+    hist, _ = np.histogram(filtered_audio, bins=HISTOGRAM_BINS, range=HISTOGRAM_RANGE)
+    return render_histogram_counts(hist)
+
+def render_histogram_counts(hist):
+    """
+    Render already binned histogram counts in memory.
+
+    Args:
+        hist (np.ndarray): HISTOGRAM_BINS counts over HISTOGRAM_RANGE, e.g.
+            accumulated chunk by chunk while audio is streamed in.
+
+    Returns:
+        np.ndarray: RGB image of shape (height, width, 3) and dtype uint8.
+    """
+    global _histogram_canvas
+    if _histogram_canvas is None:
+        with _histogram_canvas_lock:
+            if _histogram_canvas is None:
+                _histogram_canvas = _HistogramCanvas()
+    return _histogram_canvas.render(hist)
+
+def audio_to_histogram(audio, sr, cutoff_frequency=4000):
+    """
+    Filter decoded audio and render its histogram image in memory.
+
+    Args:
+        audio (np.ndarray): Audio time series as returned by load_audio.
+        sr (int): Sample rate of the audio.
+        cutoff_frequency (float): Cutoff frequency for the low-pass filter.
+
+    Returns:
+        np.ndarray: RGB histogram image of dtype uint8.
+    """
+    filtered_audio = filter_audio(audio, cutoff_frequency, sr)
+    return render_histogram(filtered_audio)
+
 def process_audio(file_path, cutoff_frequency=4000, output_dir=None):
     """
     Process the audio by filtering, plotting spectrograms, and computing histograms.
@@ -112,7 +257,7 @@ def process_audio(file_path, cutoff_frequency=4000, output_dir=None):
     ensure_output_directory(output_dir)
     
     # Load audio
-    audio, sr = load_audio(file_path, sr=44100)
+    audio, sr = load_audio(file_path, sr=DEFAULT_SAMPLE_RATE)
     
     # Plot and save original spectrogram
     plot_spectrogram(audio, sr, title='Original Audio Spectrogram', output_dir=output_dir)
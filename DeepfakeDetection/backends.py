@@ -0,0 +1,115 @@
+"""
+CPU inference backends for Deep4SNet.
+
+The eager model evaluates every BatchNorm and Dropout at run time and walks
+the Python module tree for each forward pass. The backends below trade a
+little preparation at load time for cheaper logins:
+
+- 'eager':        the model as trained
+- 'torchscript':  scripted, frozen (BatchNorm folded into the convolutions)
+                  and optimized for inference
+- 'compile':      torch.compile of the BatchNorm-folded model
+- 'dynamic_int8': int8 weights for the Linear layers, activations quantized
+                  on the fly (the convolutions stay float32)
+- 'static_int8':  convolutions and Linear layers in int8 with activation
+                  ranges calibrated on the Validation_Set histograms by
+                  `python -m DeepfakeDetection.optimize --calibrate`, which
+                  saves a TorchScript file next to the weights
+
+Any backend can additionally run in channels-last memory format.
+"""
+import os
+import copy
+import logging
+import torch
+import torch.nn as nn
+from torch.ao.quantization import fuse_modules, quantize_dynamic, get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('eager', 'torchscript', 'compile', 'dynamic_int8', 'static_int8')
+
+# Backend used by DeepfakeDetector unless one is passed explicitly
+INFERENCE_BACKEND = os.environ.get('DEEPFAKE_BACKEND', 'eager').lower()
+CHANNELS_LAST = os.environ.get('DEEPFAKE_CHANNELS_LAST', '0').lower() not in ('0', 'false', 'no')
+
+# Conv2d, BatchNorm2d, ReLU of every block of Deep4SNet.features
+CONV_BLOCKS = [[f'features.{i}', f'features.{i + 1}', f'features.{i + 2}'] for i in (0, 5, 10, 15)]
+INPUT_SHAPE = (1, 1, 128, 128)
+
+def quantized_model_path(model_path):
+    """Where the calibrated static int8 model for `model_path` is saved."""
+    return f"{os.path.splitext(model_path)[0]}_int8.pt"
+
+def fuse_conv_bn(model):
+    """Return an eval-mode copy of Deep4SNet with BatchNorm folded into the convolutions (and ReLU fused)."""
+    fused = copy.deepcopy(model).eval()
+    return fuse_modules(fused, CONV_BLOCKS + [['classifier.2', 'classifier.3']])
+
+def to_channels_last(model):
+    return model.to(memory_format=torch.channels_last)
+
+def calibrate_static_int8(model, batches):
+    """
+    Post-training static quantization with FX graph mode.
+
+    :param model: eager Deep4SNet
+    :param batches: iterable of (N, 1, 128, 128) float tensors used to
+                    observe the activation ranges
+    :return: quantized GraphModule
+    """
+    example = torch.zeros(INPUT_SHAPE)
+    prepared = prepare_fx(fuse_conv_bn(model), get_default_qconfig_mapping('x86'), example_inputs=(example,))
+    with torch.inference_mode():
+        for batch in batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+def save_static_int8(quantized, path):
+    """Trace and freeze a quantized model into a TorchScript file that loads without the FX machinery."""
+    with torch.inference_mode():
+        traced = torch.jit.freeze(torch.jit.trace(quantized, torch.zeros(INPUT_SHAPE)))
+    torch.jit.save(traced, path)
+
+def prepare_model(model, backend=INFERENCE_BACKEND, channels_last=CHANNELS_LAST, model_path=None):
+    """
+    Turn a loaded eval-mode Deep4SNet into the callable for `backend`.
+
+    :param model: eager Deep4SNet with its weights loaded
+    :param backend: one of BACKENDS
+    :param channels_last: run in channels-last memory format (inputs must match)
+    :param model_path: path of the .pth weights; 'static_int8' loads the
+                       calibrated model saved next to it
+    :return: callable mapping an (N, 1, 128, 128) tensor to logits
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown deepfake backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    model = model.eval()
+    device = next(model.parameters()).device
+
+    if backend == 'static_int8':
+        path = quantized_model_path(model_path) if model_path else None
+        if path is None or not os.path.exists(path):
+            raise ValueError(f"No calibrated int8 model at {path}; run python -m DeepfakeDetection.optimize --calibrate")
+        prepared = torch.jit.load(path, map_location='cpu')
+    elif backend == 'dynamic_int8':
+        prepared = quantize_dynamic(copy.deepcopy(model), {nn.Linear}, dtype=torch.qint8)
+    elif backend == 'torchscript':
+        prepared = torch.jit.optimize_for_inference(torch.jit.script(copy.deepcopy(model)))
+    elif backend == 'compile':
+        prepared = torch.compile(fuse_conv_bn(model))
+    else:
+        prepared = model
+
+    if channels_last and backend not in ('static_int8', 'torchscript'):
+        prepared = to_channels_last(prepared)
+
+    # Warm up: scripted and compiled models specialize on their first calls
+    example = torch.zeros(INPUT_SHAPE, device=device)
+    if channels_last:
+        example = example.contiguous(memory_format=torch.channels_last)
+    with torch.inference_mode():
+        prepared(example)
+    logger.info(f"Deepfake model prepared with the '{backend}' backend{' (channels-last)' if channels_last else ''}")
+    return prepared
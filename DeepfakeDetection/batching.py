@@ -0,0 +1,105 @@
+"""
+Micro-batching for the deepfake detector.
+
+Logins arrive on separate request threads, and each used to run its own
+1x1x128x128 forward pass. The batcher queues their input tensors, and one
+background thread runs them through Deep4SNet together, as soon as
+`max_batch_size` requests are waiting or the oldest has waited `max_wait_ms`.
+Each caller blocks on a Future for its own result. A request that arrives
+alone pays at most `max_wait_ms` of extra latency.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Collects concurrent predictions into batches for DeepfakeDetector.predict_batch.
+
+    The worker thread is started on first use, and again in a forked child,
+    where threads of the parent do not survive.
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=5.0):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                # Anything queued before a fork belongs to the parent
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='deepfake-batcher', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+                logger.info(f"Started deepfake micro-batcher (batch <= {self.max_batch_size}, "
+                            f"wait <= {self.max_wait * 1000:g} ms)")
+            return self._queue
+
+    def submit(self, image):
+        """Queue a 1x128x128 input tensor; returns a Future for its result dict."""
+        future = Future()
+        self._ensure_started().put((image, future))
+        return future
+
+    def predict(self, image, timeout=None):
+        """Submit an input and wait for its result, like DeepfakeDetector.predict_tensor."""
+        return self.submit(image).result(timeout=timeout)
+
+    def _collect(self, requests):
+        """Block for the first request, then gather more until the batch is full or the wait runs out."""
+        batch = [requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(requests.get(timeout=remaining) if remaining > 0 else requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        requests = self._queue
+        while True:
+            batch = self._collect(requests)
+            # Callers that gave up are not worth a forward pass
+            batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.detector.predict_batch([image for image, _ in batch])
+            except Exception as e:
+                logger.error(f"Deepfake batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._requests += len(batch)
+
+    def stats(self):
+        """Queue depth and the distribution of batch sizes run so far."""
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": batches,
+                "mean_batch_size": round(self._requests / batches, 2) if batches else 0.0,
+                "batch_sizes": {str(size): count for size, count in sorted(self._batch_sizes.items())}
+            }
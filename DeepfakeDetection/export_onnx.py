@@ -0,0 +1,73 @@
+"""
+Export Deep4SNet to ONNX for torch-free serving.
+
+    python -m DeepfakeDetection.export_onnx [--model models/best_model.pth] [--output models/best_model.onnx]
+
+The graph takes a (batch, 1, 128, 128) float32 input, dynamic in the batch
+dimension, and outputs the softmax probabilities [real, fake]. After export,
+ONNX Runtime's outputs are compared with the eager model's.
+"""
+import os
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+from DeepfakeDetection.train import Deep4SNet
+from DeepfakeDetection.onnx_backend import OnnxModel, INPUT_SIZE
+
+OPSET_VERSION = 17
+
+class ProbabilityModel(nn.Module):
+    """Deep4SNet followed by the softmax that DeepfakeDetector applies to its logits."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return torch.softmax(self.model(x), dim=1)
+
+def onnx_model_path(model_path):
+    return f"{os.path.splitext(model_path)[0]}.onnx"
+
+def load_model(model_path):
+    model = Deep4SNet()
+    checkpoint = torch.load(model_path, map_location='cpu')
+    model.load_state_dict(checkpoint['model_state_dict'])
+    return model.eval()
+
+def export_onnx(model, output_path, opset_version=OPSET_VERSION):
+    """Write `model` (with softmax) to `output_path` with a dynamic batch dimension."""
+    example = torch.zeros(2, 1, INPUT_SIZE, INPUT_SIZE)
+    torch.onnx.export(
+        ProbabilityModel(model).eval(), (example,), output_path,
+        input_names=['input'], output_names=['probabilities'],
+        dynamic_axes={'input': {0: 'batch'}, 'probabilities': {0: 'batch'}},
+        opset_version=opset_version, dynamo=False
+    )
+
+def verify(model, onnx_path, batch_sizes=(1, 8)):
+    """Largest absolute difference between eager and ONNX Runtime probabilities over random batches."""
+    session = OnnxModel(onnx_path)
+    rng = np.random.default_rng(0)
+    worst = 0.0
+    for batch_size in batch_sizes:
+        batch = rng.uniform(-1, 1, (batch_size, 1, INPUT_SIZE, INPUT_SIZE)).astype(np.float32)
+        with torch.inference_mode():
+            expected = torch.softmax(model(torch.from_numpy(batch)), dim=1).numpy()
+        worst = max(worst, float(np.abs(session(batch) - expected).max()))
+    return worst
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Export Deep4SNet to ONNX.")
+    parser.add_argument('--model', default=os.path.join(base_dir, 'models', 'best_model.pth'))
+    parser.add_argument('--output', help="defaults to the model path with an .onnx extension")
+    parser.add_argument('--opset', type=int, default=OPSET_VERSION)
+    args = parser.parse_args()
+
+    output_path = args.output or onnx_model_path(args.model)
+    model = load_model(args.model)
+    export_onnx(model, output_path, opset_version=args.opset)
+    print(f"Exported {args.model} to {output_path}")
+    print(f"Max probability difference against eager: {verify(model, output_path):.2e}")
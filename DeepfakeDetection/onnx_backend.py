@@ -0,0 +1,51 @@
+"""
+ONNX Runtime backend for Deep4SNet.
+
+Serves the graph written by `python -m DeepfakeDetection.export_onnx`, which
+already ends in the softmax, with nothing but numpy, Pillow and
+onnxruntime: no torch or torchvision import. The input transform below
+reproduces the torchvision pipeline used for training and the .pth backends.
+"""
+import os
+import logging
+import numpy as np
+from PIL import Image
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+INPUT_SIZE = 128
+
+# Intra-op threads per ONNX Runtime session (0 lets ORT pick)
+ORT_THREADS = int(os.environ.get('ORT_THREADS', 0))
+
+def histogram_transform(image):
+    """
+    numpy equivalent of Resize((128, 128)), Grayscale(1), ToTensor() and
+    Normalize([0.5], [0.5]) for a PIL image.
+
+    :return: (1, 128, 128) float32 array in [-1, 1]
+    """
+    image = image.resize((INPUT_SIZE, INPUT_SIZE), Image.BILINEAR).convert('L')
+    pixels = np.asarray(image, dtype=np.float32) / 255.0
+    return ((pixels - 0.5) / 0.5)[np.newaxis]
+
+class OnnxModel:
+    """An exported Deep4SNet, callable on an (N, 1, 128, 128) float32 batch; returns (N, 2) probabilities."""
+
+    def __init__(self, model_path, intra_op_threads=ORT_THREADS):
+        if ort is None:
+            raise ImportError("onnxruntime is required to serve an .onnx deepfake model")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        logger.info(f"ONNX Runtime session for {model_path} ready")
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
@@ -0,0 +1,100 @@
+"""
+Calibrate and check the Deep4SNet inference backends.
+
+    # Calibrate the static int8 model on a shuffled slice of the Training_Set histograms
+    python -m DeepfakeDetection.optimize --data-root <H-Voice_SiF-Filtered> --calibrate
+
+    # Accuracy delta against the eager model, and latency, per backend
+    python -m DeepfakeDetection.optimize --data-root <H-Voice_SiF-Filtered> --backends torchscript static_int8 --channels-last
+"""
+import os
+import time
+import argparse
+import torch
+from torch.utils.data import DataLoader
+from DeepfakeDetection.train import HistogramsDataset
+from DeepfakeDetection.run_record import DeepfakeDetector
+from DeepfakeDetection.backends import BACKENDS, INPUT_SHAPE, calibrate_static_int8, save_static_int8, quantized_model_path
+
+def histogram_loader(data_root, split, transform, batch_size=32, shuffle=False, seed=0):
+    dataset = HistogramsDataset(root_dir=data_root, dataset_type=split, custom_transform=transform)
+    # A seeded shuffle draws calibration batches from every class, reproducibly
+    generator = torch.Generator().manual_seed(seed) if shuffle else None
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, generator=generator, num_workers=0)
+
+def evaluate(detector, loader):
+    """Run every batch through the detector's backend; returns (probabilities, labels)."""
+    probabilities, labels = [], []
+    with torch.inference_mode():
+        for images, targets in loader:
+            if detector.channels_last:
+                images = images.contiguous(memory_format=torch.channels_last)
+            outputs = detector.model(images.to(detector.device))
+            probabilities.append(torch.nn.functional.softmax(outputs, dim=1).cpu())
+            labels.append(targets)
+    return torch.cat(probabilities), torch.cat(labels)
+
+def compare(reference, probabilities, labels):
+    """Accuracy of a backend and how far its outputs are from the eager reference."""
+    predicted = probabilities.argmax(dim=1)
+    return {
+        'accuracy': (predicted == labels).float().mean().item() * 100,
+        'agreement': (predicted == reference.argmax(dim=1)).float().mean().item() * 100,
+        'max_prob_delta': (probabilities - reference).abs().max().item() * 100
+    }
+
+def time_backend(detector, batch_size, repeats=20):
+    """Best-of-`repeats` latency of one forward pass over a batch, in milliseconds."""
+    batch = torch.zeros((batch_size,) + INPUT_SHAPE[1:], device=detector.device)
+    if detector.channels_last:
+        batch = batch.contiguous(memory_format=torch.channels_last)
+    best = float('inf')
+    with torch.inference_mode():
+        detector.model(batch)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            detector.model(batch)
+            best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Calibrate and check the Deep4SNet inference backends.")
+    parser.add_argument('--model', default=os.path.join(base_dir, 'models', 'best_model.pth'))
+    parser.add_argument('--data-root', required=True, help="histogram dataset with Training_Set/Validation_Set/Test_Set")
+    parser.add_argument('--split', default='Validation_Set', help="split the backends are compared on")
+    parser.add_argument('--calibrate', action='store_true', help="calibrate and save the static int8 model first")
+    parser.add_argument('--calibration-split', default='Training_Set',
+                        help="split the calibration batches are drawn from; keep it apart from --split")
+    parser.add_argument('--calibration-batches', type=int, default=16)
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--channels-last', action='store_true')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8])
+    args = parser.parse_args()
+
+    reference_detector = DeepfakeDetector(args.model, backend='eager')
+    loader = histogram_loader(args.data_root, args.split, reference_detector.transform)
+
+    if args.calibrate:
+        if args.calibration_split == args.split:
+            print(f"Warning: calibrating on {args.split}, the split it is evaluated on; the accuracy delta will be optimistic")
+        calibration_loader = histogram_loader(args.data_root, args.calibration_split, reference_detector.transform,
+                                              shuffle=True)
+        calibration = (images for i, (images, _) in zip(range(args.calibration_batches), calibration_loader))
+        path = quantized_model_path(args.model)
+        save_static_int8(calibrate_static_int8(reference_detector.model.cpu(), calibration), path)
+        print(f"Saved static int8 model to {path}")
+
+    reference, labels = evaluate(reference_detector, loader)
+    reference_accuracy = compare(reference, reference, labels)['accuracy']
+    print(f"{'backend':>14} {'accuracy':>9} {'delta':>7} {'agree':>7} {'max dp':>7} " +
+          " ".join(f"{f'b={b}':>9}" for b in args.batch_sizes))
+    for backend in args.backends:
+        detector = DeepfakeDetector(args.model, backend=backend, channels_last=args.channels_last)
+        if detector.backend != backend:
+            print(f"{backend:>14} unavailable")
+            continue
+        r = compare(reference, *evaluate(detector, loader))
+        timings = " ".join(f"{time_backend(detector, b):>7.2f}ms" for b in args.batch_sizes)
+        print(f"{backend:>14} {r['accuracy']:>8.2f}% {r['accuracy'] - reference_accuracy:>+6.2f}% "
+              f"{r['agreement']:>6.2f}% {r['max_prob_delta']:>6.2f}% {timings}")
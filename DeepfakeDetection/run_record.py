@@ -1,17 +1,43 @@
-import torch
-import torchvision.transforms as transforms
 from PIL import Image
 import logging
-from tqdm import tqdm
-from DeepfakeDetection.train import Deep4SNet
+import numpy as np
+from DeepfakeDetection.DataProcessing import audio_to_histogram, render_histogram, render_histogram_counts
+from DeepfakeDetection.batching import MicroBatcher
+from DeepfakeDetection.onnx_backend import OnnxModel, histogram_transform
+
+# Serving an .onnx model only needs numpy, Pillow and onnxruntime
+try:
+    import torch
+    import torchvision.transforms as transforms
+    from DeepfakeDetection.train import Deep4SNet
+    from DeepfakeDetection.backends import INFERENCE_BACKEND, CHANNELS_LAST, prepare_model
+except ImportError:
+    torch = None
+    INFERENCE_BACKEND, CHANNELS_LAST = 'eager', False
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class DeepfakeDetector:
-    def __init__(self, model_path):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    def __init__(self, model_path, backend=INFERENCE_BACKEND, channels_last=CHANNELS_LAST):
+        # Set by enable_batching
+        self.batcher = None
+        self.model_path = model_path
+
+        if model_path.endswith('.onnx'):
+            # Exported graph (softmax included) on ONNX Runtime; see export_onnx.py
+            self.model = OnnxModel(model_path)
+            self.backend, self.channels_last = 'onnx', False
+            self.transform = histogram_transform
+            logger.info(f"Model loaded from {model_path}")
+            return
+        if torch is None:
+            raise ImportError(f"torch and torchvision are required to load {model_path}; export it to ONNX instead")
+
+        # The optimized backends all target CPU inference
+        use_cuda = torch.cuda.is_available() and backend == 'eager'
+        self.device = torch.device("cuda" if use_cuda else "cpu")
         logger.info(f"Using device: {self.device}")
         
         # Load model architecture
@@ -25,6 +51,14 @@ class DeepfakeDetector:
         
         logger.info(f"Model loaded from {model_path}")
         logger.info(f"Best validation accuracy: {checkpoint['val_acc']:.2f}%")
+
+        # Swap in the optimized inference backend; keep the eager model if it cannot be prepared
+        try:
+            self.model = prepare_model(self.model, backend, channels_last=channels_last, model_path=model_path)
+            self.backend, self.channels_last = backend, channels_last
+        except Exception as e:
+            logger.warning(f"Could not prepare the '{backend}' backend, using eager inference: {e}")
+            self.backend, self.channels_last = 'eager', False
         
         # Define transform
         self.transform = transforms.Compose([
@@ -34,40 +68,114 @@ class DeepfakeDetector:
             transforms.Normalize(mean=[0.5], std=[0.5])
         ])
     
+    def image_to_tensor(self, image):
+        """Transform a PIL image into a normalized 1x128x128 tensor (numpy array for an .onnx model)"""
+        if image.mode == 'RGBA':
+            image = image.convert('RGB')
+        return self.transform(image)
+
+    def audio_to_tensor(self, audio, sr, cutoff_frequency=4000):
+        """Build the model input directly from decoded audio, without writing the histogram PNG"""
+        histogram = audio_to_histogram(audio, sr, cutoff_frequency=cutoff_frequency)
+        return self.image_to_tensor(Image.fromarray(histogram))
+
+    def filtered_to_tensor(self, filtered_audio):
+        """Build the model input from audio that has already been low-pass filtered"""
+        return self.image_to_tensor(Image.fromarray(render_histogram(filtered_audio)))
+
+    def histogram_to_tensor(self, hist):
+        """Build the model input from histogram counts of filtered audio"""
+        return self.image_to_tensor(Image.fromarray(render_histogram_counts(hist)))
+
+    def set_num_threads(self, num_threads):
+        """Size the inference thread pool of this process, e.g. in a gunicorn worker after fork"""
+        if self.backend == 'onnx':
+            # An ORT session cannot resize its pool, and a pool inherited across fork has no threads
+            self.model = OnnxModel(self.model_path, intra_op_threads=num_threads)
+        else:
+            torch.set_num_threads(num_threads)
+
+    def enable_batching(self, max_batch_size=8, max_wait_ms=5.0):
+        """Route predict_tensor (and everything built on it) through a shared micro-batcher"""
+        self.batcher = MicroBatcher(self, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        return self.batcher
+
+    def predict_batch(self, images):
+        """Predict for a list of 1x128x128 input tensors (arrays for an .onnx model) with one forward pass"""
+        if self.backend == 'onnx':
+            probabilities = self.model(np.stack(images))
+        else:
+            batch = torch.stack(images)
+            if self.channels_last:
+                batch = batch.contiguous(memory_format=torch.channels_last)
+
+            # Predict
+            with torch.inference_mode():
+                batch = batch.to(self.device)
+                outputs = self.model(batch)
+                probabilities = torch.nn.functional.softmax(outputs, dim=1).cpu().numpy()
+
+        # Get results
+        results = []
+        for real, fake in probabilities.tolist():
+            is_fake = fake > real
+            results.append({
+                'prediction': 'FAKE' if is_fake else 'REAL',
+                'confidence': max(real, fake) * 100,
+                'probabilities': {
+                    'real': real * 100,
+                    'fake': fake * 100
+                }
+            })
+        return results
+
+    def predict_tensor(self, image):
+        """Predict for a single 1x128x128 input tensor"""
+        if self.batcher is not None:
+            return self.batcher.predict(image)
+        return self.predict_batch([image])[0]
+
     def predict_single(self, image_path):
         """Predict for a single image"""
         try:
             # Load and transform image
             with Image.open(image_path) as img:
-                if img.mode == 'RGBA':
-                    img = img.convert('RGB')
-                image = self.transform(img)
-                image = image.unsqueeze(0)  # Add batch dimension
-                
-            # Predict
-            with torch.no_grad():
-                image = image.to(self.device)
-                outputs = self.model(image)
-                probabilities = torch.nn.functional.softmax(outputs, dim=1)
-                pred_prob, predicted = torch.max(probabilities, 1)
-                
-            # Get results
-            is_fake = predicted.item() == 1
-            confidence = pred_prob.item() * 100
-            
-            return {
-                'prediction': 'FAKE' if is_fake else 'REAL',
-                'confidence': confidence,
-                'probabilities': {
-                    'real': probabilities[0][0].item() * 100,
-                    'fake': probabilities[0][1].item() * 100
-                }
-            }
-            
+                image = self.image_to_tensor(img)
+            return self.predict_tensor(image)
+
         except Exception as e:
             logger.error(f"Error processing image {image_path}: {str(e)}")
             return None
 
+    def predict_audio(self, audio, sr, cutoff_frequency=4000):
+        """Predict for decoded audio, skipping the spectrogram and histogram image files"""
+        try:
+            image = self.audio_to_tensor(audio, sr, cutoff_frequency=cutoff_frequency)
+            return self.predict_tensor(image)
+
+        except Exception as e:
+            logger.error(f"Error processing audio: {str(e)}")
+            return None
+
+    def predict_filtered(self, filtered_audio):
+        """Predict for audio already low-pass filtered by the shared feature front-end"""
+        try:
+            image = self.filtered_to_tensor(filtered_audio)
+            return self.predict_tensor(image)
+
+        except Exception as e:
+            logger.error(f"Error processing audio: {str(e)}")
+            return None
+
+    def predict_histogram(self, hist):
+        """Predict for histogram counts accumulated over filtered audio, e.g. by a streaming login"""
+        try:
+            image = self.histogram_to_tensor(hist)
+            return self.predict_tensor(image)
+
+        except Exception as e:
+            logger.error(f"Error processing histogram: {str(e)}")
+            return None
 
 def main():
     # Initialize detector
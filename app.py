@@ -1,6 +1,13 @@
+import time
+
+# Measured from the first import so /health can report how long startup took
+import_started = time.perf_counter()
+
 import os
+import re
 import logging
 import shutil
+import threading
 import datetime
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify
@@ -8,22 +15,36 @@ from flask import Flask, request, jsonify
 # Load environment variables
 load_dotenv()
 from flask_cors import CORS
+try:
+    # WebSocket transport for streaming logins (optional)
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 import numpy as np
 import joblib
 import json
 from scipy.io import wavfile
-from voiceauth.gmm import load_features_from_directory, train_gmm, save_gmm_model
-from voiceauth.feature_extraction import extract_features
-from DeepfakeDetection.DataProcessing import process_audio
-from DeepfakeDetection.run_record import DeepfakeDetector
+from voiceauth.gmm import load_features_from_directory, train_gmm, save_gmm_model, load_compact_ubm
+from voiceauth.scoring import score_top_c, to_compact
+from voiceauth.feature_extraction import extract_features, FEATURE_NORMALIZATION, model_normalization
+from voiceauth.audio import DecodedAudio, DEFAULT_SAMPLE_RATE
+from voiceauth.migrate_sample_rate import model_sample_rate
+from voiceauth.frontend import get_frontend
+from voiceauth.vad import VAD_ENABLED, trim_silence, default_detector
+from voiceauth.model_cache import SpeakerModelCache, DEFAULT_MAX_BYTES, read_stats
+from voiceauth.model_store import ModelStore
+from voiceauth.identification import SpeakerIndex, partition_speakers, exact_candidates
 from banking_service import get_user_data, transfer_funds
 from nlp_service import NLPService
-from asr_service import IndicASR
+from asr_service import ASR_SAMPLE_RATE
 from otp_service import OTPService
+from enrollment_service import EnrollmentService
+from login_pipeline import LoginPipeline
+from streaming_login import StreamingLoginSession
+from startup import LazyService, record_timing, startup_report, warm_up, warm_up_in_background
 
 nlp_service = NLPService()
 otp_service = OTPService()
-asr_service = None # Initialize lazily or in main block
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,6 +52,7 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+sock = Sock(app) if Sock is not None else None
 
 @app.route("/", methods=["GET"])
 def home():
@@ -39,33 +61,216 @@ def home():
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UBM_MODEL_PATH = os.path.join(BASE_DIR, 'voiceauth', 'model', 'ubm_model.pkl')
-DEEPFAKE_MODEL_PATH = os.path.join(BASE_DIR, 'DeepfakeDetection', 'models', 'best_model.pth')
+# A .pth checkpoint, or an .onnx export served with ONNX Runtime (see DeepfakeDetection/export_onnx.py)
+DEEPFAKE_MODEL_PATH = os.environ.get('DEEPFAKE_MODEL_PATH', os.path.join(BASE_DIR, 'DeepfakeDetection', 'models', 'best_model.pth'))
 GMM_MODEL_DIR = os.path.join(BASE_DIR, 'voiceauth', 'model')
 DATA_DIR = os.path.join(BASE_DIR, 'Data')
+# Usernames name directories and files under DATA_DIR and GMM_MODEL_DIR
+USERNAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+# 'em' refits a GMM seeded from the UBM; 'map' runs relevance-MAP adaptation of the UBM
+ENROLLMENT_MODE = os.environ.get('ENROLLMENT_MODE', 'em').lower()
+# 'full' evaluates every component; 'topc' uses UBM top-C fast scoring for MAP-enrolled models
+SCORING_MODE = os.environ.get('SCORING_MODE', 'full').lower()
+# Concurrent deepfake checks are run as one batch of up to DEEPFAKE_MAX_BATCH
+# inputs, waiting at most DEEPFAKE_MAX_WAIT_MS for a batch to fill (DEEPFAKE_BATCHING=0 disables)
+DEEPFAKE_BATCHING = os.environ.get('DEEPFAKE_BATCHING', '1').lower() not in ('0', 'false', 'no')
+DEEPFAKE_MAX_BATCH = int(os.environ.get('DEEPFAKE_MAX_BATCH', 8))
+DEEPFAKE_MAX_WAIT_MS = float(os.environ.get('DEEPFAKE_MAX_WAIT_MS', 5.0))
+# Streaming logins are scored every STREAM_EVALUATE_SECONDS of new audio and
+# decided after at most STREAM_MAX_SECONDS; the socket is dropped after
+# STREAM_IDLE_SECONDS without a message
+STREAM_EVALUATE_SECONDS = float(os.environ.get('STREAM_EVALUATE_SECONDS', 0.25))
+STREAM_MAX_SECONDS = float(os.environ.get('STREAM_MAX_SECONDS', 15.0))
+STREAM_IDLE_SECONDS = float(os.environ.get('STREAM_IDLE_SECONDS', 10.0))
+# Load and warm up every model in the background as soon as the app is imported
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', '0').lower() not in ('0', 'false', 'no')
 
 # Ensure directories exist
 os.makedirs(GMM_MODEL_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
 
-# Initialize Deepfake Detector globally
-try:
-    deepfake_detector = DeepfakeDetector(DEEPFAKE_MODEL_PATH)
-    logger.info("Deepfake Detector initialized successfully.")
-except Exception as e:
-    logger.error(f"Failed to initialize Deepfake Detector: {e}")
-    deepfake_detector = None
-
-# Initialize ASR Service
-try:
-    asr_service = IndicASR()
-    logger.info("IndicASR initialized successfully.")
-except Exception as e:
-    logger.error(f"Failed to initialize IndicASR: {e}")
-    asr_service = None
+# Per-worker cache of speaker GMMs and baseline stats
+speaker_models = SpeakerModelCache(
+    max_bytes=int(os.environ.get('GMM_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+)
+
+# Packed, memory-mapped speaker models shared by all workers; `.gmm` pickles
+# from before the store are still served through speaker_models
+model_store = ModelStore(os.path.join(GMM_MODEL_DIR, 'store'))
+
+# Speakers kept as `.gmm` pickles (from before the store, or enrollments
+# whose shape did not fit its layout) are identified through this index,
+# synced with GMM_MODEL_DIR on every request
+legacy_speakers = None
+legacy_speakers_lock = threading.Lock()
+
+def legacy_speaker_index(ubm):
+    global legacy_speakers
+    with legacy_speakers_lock:
+        if legacy_speakers is None or legacy_speakers.ubm is not ubm:
+            legacy_speakers = SpeakerIndex(ubm)
+        legacy_speakers.sync_directory(GMM_MODEL_DIR)
+        return legacy_speakers
+
+# Heavy subsystems are built on first use (or by /api/warmup), so importing
+# the app - in every worker - stays cheap
+def load_deepfake_detector():
+    # torch (or onnxruntime), torchvision and matplotlib come in with the detector
+    from DeepfakeDetection.run_record import DeepfakeDetector
+    detector = DeepfakeDetector(DEEPFAKE_MODEL_PATH)
+    if DEEPFAKE_BATCHING:
+        detector.enable_batching(DEEPFAKE_MAX_BATCH, DEEPFAKE_MAX_WAIT_MS)
+    return detector
+
+def warm_up_deepfake_detector(detector):
+    # One second of silence through the histogram renderer and one forward pass
+    silence = np.zeros(DEFAULT_SAMPLE_RATE, dtype=np.float32)
+    detector.predict_batch([detector.filtered_to_tensor(silence)])
+
+def load_asr_service():
+    from asr_service import IndicASR
+    return IndicASR()
+
+def warm_up_speaker_verification(ubm):
+    # Feature extraction filterbanks and a UBM scoring pass on low-level noise
+    noise = np.random.default_rng(0).normal(0, 100, DEFAULT_SAMPLE_RATE).astype(np.int16)
+    ubm.score(extract_features(noise, DEFAULT_SAMPLE_RATE))
+
+deepfake_detector = LazyService('deepfake_detector', load_deepfake_detector, warm_up=warm_up_deepfake_detector,
+                                after_fork=lambda detector, num_threads: detector.set_num_threads(num_threads))
+asr_service = LazyService('asr_service', load_asr_service)
+speaker_verification = LazyService('speaker_verification', lambda: load_compact_ubm(UBM_MODEL_PATH),
+                                   warm_up=warm_up_speaker_verification)
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy", "service": "Voice Authentication API"}), 200
+    return jsonify({
+        "status": "healthy",
+        "service": "Voice Authentication API",
+        "model_cache": speaker_models.stats(),
+        "model_store": model_store.stats(),
+        "deepfake_batching": deepfake_detector.instance.batcher.stats() if deepfake_detector.instance and deepfake_detector.instance.batcher else None,
+        "startup": startup_report()
+    }), 200
+
+@app.route('/api/warmup', methods=['POST'])
+def warmup():
+    """Load every subsystem and run one dummy inference through each; returns the startup report."""
+    return jsonify(warm_up()), 200
+
+def enroll_user(job, username):
+    """Train and save the speaker model for samples already stored in Data/<username>."""
+    user_dir = os.path.join(DATA_DIR, username)
+    samples_processed = len([f for f in os.listdir(user_dir) if f.endswith('.wav')])
+
+    # Train GMM
+    with job.stage('feature_extraction'):
+        features = load_features_from_directory(user_dir)
+    if features.size == 0:
+        raise ValueError("No valid features extracted from audio samples")
+
+    n_components = 32
+    with job.stage('training'):
+        gmm_model = train_gmm(features, UBM_MODEL_PATH, n_components, strategy=ENROLLMENT_MODE)
+    
+    # Save GMM model into the packed store; models of a different shape
+    # than the store's layout fall back to a pickle
+    gmm_model_save_path = os.path.join(GMM_MODEL_DIR, f"{username}.gmm")
+    with job.stage('save_model'):
+        try:
+            model_store.put(username, to_compact(gmm_model), enrollment_mode=ENROLLMENT_MODE)
+            model_location = model_store.store_dir
+            if os.path.exists(gmm_model_save_path):
+                os.remove(gmm_model_save_path)
+        except ValueError as e:
+            logger.warning(f"Saving {username} as a pickle instead of in the model store: {e}")
+            # find_speaker_model prefers the store, so retire any earlier row there
+            model_store.delete(username)
+            save_gmm_model(gmm_model, gmm_model_save_path)
+            model_location = gmm_model_save_path
+
+    # Calculate and save baseline stats
+    # We use the training features to establish a baseline score for this user
+    with job.stage('baseline'):
+        baseline_scores = gmm_model.score_samples(features)
+        mean_score = np.mean(baseline_scores)
+        std_score = np.std(baseline_scores)
+        
+        stats = {
+            "mean_score": float(mean_score),
+            "std_score": float(std_score),
+            "sample_rate": DEFAULT_SAMPLE_RATE,
+            "vad": VAD_ENABLED,
+            "normalization": FEATURE_NORMALIZATION,
+            "enrollment_mode": ENROLLMENT_MODE,
+            "timestamp": str(datetime.datetime.now())
+        }
+        
+        stats_path = os.path.join(user_dir, "model_stats.json")
+        with open(stats_path, 'w') as f:
+            json.dump(stats, f)
+    speaker_models.invalidate(username)
+        
+    logger.info(f"Saved baseline stats for {username}: Mean={mean_score:.2f}, Std={std_score:.2f}")
+
+    return {
+        "samples_processed": samples_processed,
+        "model_path": model_location,
+        "baseline_score": float(mean_score)
+    }
+
+def find_speaker_model(username):
+    """Speaker model (a view of the shared store, or a cached legacy pickle) and baseline stats; (None, None) if not enrolled."""
+    if not USERNAME_PATTERN.match(username):
+        return None, None
+    stats_path = os.path.join(DATA_DIR, username, "model_stats.json")
+    gmm_model_path = os.path.join(GMM_MODEL_DIR, f"{username}.gmm")
+
+    gmm_model = model_store.get(username)
+    if gmm_model is not None:
+        return gmm_model, read_stats(stats_path, username)
+    if os.path.exists(gmm_model_path):
+        return speaker_models.get(username, gmm_model_path, stats_path)
+    return None, None
+
+def adaptive_threshold(username, stats):
+    """Acceptance threshold on a login's mean log-likelihood for this user."""
+    # Adaptive Thresholding
+    threshold = -35.0 # Fallback default
+    
+    if stats is not None:
+        try:
+            # Logic: Threshold = Mean - Margin
+            # A margin of 3-5 is usually good for GMM log-likelihoods
+            # If the user varies a lot (high std), we might want a wider margin, 
+            # but for security, a fixed margin from the mean is often safer.
+            # Let's use a margin of 5.0
+            margin = 5.0
+            threshold = stats['mean_score'] - margin
+            logger.info(f"Using Adaptive Threshold: {threshold} (Mean: {stats['mean_score']:.2f} - Margin: {margin})")
+        except Exception as e:
+            logger.warning(f"Failed to load stats for {username}, using default threshold: {e}")
+    else:
+         logger.warning(f"No stats found for {username}, using default threshold.")
+    return threshold
+
+def login_rejects(branch, result):
+    """True if a login branch's result is enough to reject the login on its own."""
+    if branch == 'deepfake_detection':
+        return bool(result) and result['prediction'] == 'FAKE'
+    return result['score'] <= result['threshold']
+
+# Deepfake detection and speaker verification of a login run concurrently on
+# this bounded pool (LOGIN_BRANCH_WORKERS threads per worker process)
+login_pipeline = LoginPipeline(max_workers=int(os.environ.get('LOGIN_BRANCH_WORKERS', 4)))
+
+enrollment_service = EnrollmentService(
+    enroll_user,
+    jobs_dir=os.path.join(DATA_DIR, '.jobs'),
+    max_workers=int(os.environ.get('ENROLLMENT_WORKERS', 2)),
+    max_pending=int(os.environ.get('ENROLLMENT_MAX_PENDING', 100)),
+    stale_after=float(os.environ.get('ENROLLMENT_STALE_SECONDS', 3600))
+)
 
 @app.route('/api/signup', methods=['POST'])
 def signup():
@@ -75,72 +280,65 @@ def signup():
         
         if not username:
             return jsonify({"error": "Username is required"}), 400
+        if not USERNAME_PATTERN.match(username):
+            return jsonify({"error": "Username may only contain letters, digits, '_' and '-'"}), 400
 
         files = request.files.getlist('audio_samples')
         if not files or len(files) == 0:
             return jsonify({"error": "No audio samples provided"}), 400
 
-        # Create user directory
-        user_dir = os.path.join(DATA_DIR, username)
-        if os.path.exists(user_dir):
-            shutil.rmtree(user_dir)  # Clear existing data if re-enrolling
-        os.makedirs(user_dir, exist_ok=True)
-        
-        # Store email in banking service
-        from banking_service import create_user
-        create_user(username, email)
-
-        # Save audio files
-        saved_files = []
-        for i, file in enumerate(files):
-            filename = f"sample_{i+1}.wav"
-            file_path = os.path.join(user_dir, filename)
-            file.save(file_path)
-            saved_files.append(file_path)
-        
-        logger.info(f"Saved {len(saved_files)} samples for user {username}")
-
-        # Train GMM
-        features = load_features_from_directory(user_dir)
-        if features.size == 0:
-            return jsonify({"error": "No valid features extracted from audio samples"}), 400
+        # Claimed across all worker processes before any sample is touched
+        if not enrollment_service.claim(username):
+            return jsonify({"error": f"Enrollment already in progress for {username}"}), 409
 
-        n_components = 32
-        gmm_model = train_gmm(features, UBM_MODEL_PATH, n_components)
-        
-        # Save GMM model
-        gmm_model_save_path = os.path.join(GMM_MODEL_DIR, f"{username}.gmm")
-        save_gmm_model(gmm_model, gmm_model_save_path)
+        try:
+            # Create user directory
+            user_dir = os.path.join(DATA_DIR, username)
+            if os.path.exists(user_dir):
+                shutil.rmtree(user_dir)  # Clear existing data if re-enrolling
+            os.makedirs(user_dir, exist_ok=True)
 
-        # Calculate and save baseline stats
-        # We use the training features to establish a baseline score for this user
-        baseline_scores = gmm_model.score_samples(features)
-        mean_score = np.mean(baseline_scores)
-        std_score = np.std(baseline_scores)
-        
-        stats = {
-            "mean_score": float(mean_score),
-            "std_score": float(std_score),
-            "timestamp": str(datetime.datetime.now())
-        }
-        
-        stats_path = os.path.join(user_dir, "model_stats.json")
-        with open(stats_path, 'w') as f:
-            json.dump(stats, f)
-            
-        logger.info(f"Saved baseline stats for {username}: Mean={mean_score:.2f}, Std={std_score:.2f}")
+            # Store email in banking service
+            from banking_service import create_user
+            create_user(username, email)
+
+            # Save audio files
+            saved_files = []
+            for i, file in enumerate(files):
+                filename = f"sample_{i+1}.wav"
+                file_path = os.path.join(user_dir, filename)
+                file.save(file_path)
+                saved_files.append(file_path)
+
+            logger.info(f"Saved {len(saved_files)} samples for user {username}")
+
+            # Train in the background; the client polls the status endpoint
+            job = enrollment_service.submit(username)
+        except Exception:
+            enrollment_service.release(username)
+            raise
+        if job is None:
+            enrollment_service.release(username)
+            return jsonify({"error": "Too many enrollments in progress. Please try again shortly."}), 503
 
         return jsonify({
-            "message": f"User {username} registered successfully",
-            "samples_processed": len(saved_files),
-            "model_path": gmm_model_save_path,
-            "baseline_score": mean_score
-        }), 201
+            "message": f"Enrollment for {username} queued",
+            "job_id": job.job_id,
+            "status": job.status,
+            "status_url": f"/api/signup/status/{job.job_id}"
+        }), 202
 
     except Exception as e:
         logger.error(f"Error during signup: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/signup/status/<job_id>', methods=['GET'])
+def signup_status(job_id):
+    status = enrollment_service.get_status(job_id)
+    if status is None:
+        return jsonify({"error": "Enrollment job not found"}), 404
+    return jsonify(status), 200
+
 @app.route('/api/login', methods=['POST'])
 def login():
     try:
@@ -152,90 +350,269 @@ def login():
         if not file:
             return jsonify({"error": "Audio file is required"}), 400
 
-        # Check if user exists
-        gmm_model_path = os.path.join(GMM_MODEL_DIR, f"{username}.gmm")
-        if not os.path.exists(gmm_model_path):
+        gmm_model, stats = find_speaker_model(username)
+        if gmm_model is None:
             return jsonify({"error": "User not found. Please sign up first."}), 404
 
-        # Save temporary file for processing
-        user_dir = os.path.join(DATA_DIR, username)
-        os.makedirs(user_dir, exist_ok=True)
-        temp_filename = f"{username}_login_attempt.wav"
-        temp_file_path = os.path.join(user_dir, temp_filename)
-        file.save(temp_file_path)
+        # Models enrolled before a change of AUDIO_SAMPLE_RATE keep working at
+        # their own rate until the user re-enrolls
+        model_rate = model_sample_rate(stats)
+        reenrollment_required = model_rate != DEFAULT_SAMPLE_RATE
+        if reenrollment_required:
+            logger.warning(f"Model for {username} was enrolled at {model_rate} Hz (canonical: {DEFAULT_SAMPLE_RATE} Hz); re-enrollment required")
+
+        # Decode once, straight from the upload; every stage below works on
+        # views of the same buffer
+        audio = DecodedAudio.from_stream(file.stream, sr=model_rate)
+
+        # Drop leading/trailing silence and pauses once, before any scoring
+        speech, vad_stats = trim_silence(audio) if VAD_ENABLED else (audio, None)
+        if vad_stats:
+            logger.info(f"VAD for {username}: kept {vad_stats['kept_fraction']:.0%} of {vad_stats['total_seconds']}s")
+
+        # One front-end per sample rate: cached filterbanks, DCT and filter coefficients
+        frontend = get_frontend(audio.rate)
 
         # 1. Deepfake Detection
-        if deepfake_detector:
-            cutoff_frequency = 4000
-            histogram_path = process_audio(temp_file_path, cutoff_frequency=cutoff_frequency, output_dir=user_dir)
-            result = deepfake_detector.predict_single(histogram_path)
-            
+        detector = deepfake_detector.get()
+
+        def detect_deepfake(checkpoint):
+            filtered_audio = frontend.lowpass(speech.samples)  # 4 kHz cutoff
+            checkpoint()
+            result = detector.predict_filtered(filtered_audio)
             if result:
                 logger.info(f"Deepfake result for {username}: {result}")
-                if result['prediction'] == 'FAKE':
-                    return jsonify({
-                        "success": False,
-                        "message": "Deepfake detected. Authentication failed.",
-                        "details": result
-                    }), 401
             else:
                 logger.warning("Deepfake detection returned None")
-        
+            return result
+
         # 2. Speaker Verification (GMM)
-        gmm_model = joblib.load(gmm_model_path)
-        
-        import librosa
-        audio, rate = librosa.load(temp_file_path, sr=44100)
-        audio = (audio * 32768).astype(np.int16)
-        
-        features = extract_features(audio, rate)
-        
-        log_likelihood = gmm_model.score(features)
-        logger.info(f"Log-Likelihood for {username}: {log_likelihood}")
+        def verify_speaker(checkpoint):
+            # Models enrolled on untrimmed samples keep being scored on the full
+            # clip, so that their baseline stays comparable
+            scored = speech if stats is None or stats.get('vad', False) else audio
+            # Features are normalized the way the model was enrolled
+            features = extract_features(scored.pcm16, scored.rate, normalization=model_normalization(stats))
+            checkpoint()
+
+            llr = None
+            if SCORING_MODE == 'topc' and stats is not None and stats.get('enrollment_mode') == 'map':
+                # Only MAP-adapted models share their component indices with the UBM
+                result = score_top_c(gmm_model, load_compact_ubm(UBM_MODEL_PATH), features)
+                log_likelihood, llr = result['score'], result['llr']
+                logger.info(f"Log-Likelihood for {username}: {log_likelihood} (top-C, LLR: {llr})")
+            else:
+                log_likelihood = gmm_model.score(features)
+                logger.info(f"Log-Likelihood for {username}: {log_likelihood}")
 
-        # Adaptive Thresholding
-        user_dir = os.path.join(DATA_DIR, username)
-        stats_path = os.path.join(user_dir, "model_stats.json")
-        
-        threshold = -35.0 # Fallback default
-        
-        if os.path.exists(stats_path):
-            try:
-                with open(stats_path, 'r') as f:
-                    stats = json.load(f)
-                
-                # Logic: Threshold = Mean - Margin
-                # A margin of 3-5 is usually good for GMM log-likelihoods
-                # If the user varies a lot (high std), we might want a wider margin, 
-                # but for security, a fixed margin from the mean is often safer.
-                # Let's use a margin of 5.0
-                margin = 5.0
-                threshold = stats['mean_score'] - margin
-                logger.info(f"Using Adaptive Threshold: {threshold} (Mean: {stats['mean_score']:.2f} - Margin: {margin})")
-            except Exception as e:
-                logger.warning(f"Failed to load stats for {username}, using default threshold: {e}")
-        else:
-             logger.warning(f"No stats found for {username}, using default threshold.")
+            return {"score": log_likelihood, "llr": llr, "threshold": adaptive_threshold(username, stats)}
+
+        # Both branches run side by side; whichever rejects first cancels the other
+        branches = {'speaker_verification': verify_speaker}
+        if detector:
+            branches['deepfake_detection'] = detect_deepfake
+        results, branch_seconds, rejected_by = login_pipeline.run(branches, rejects=login_rejects)
+
+        deepfake_result = results.get('deepfake_detection')
+        if deepfake_result and deepfake_result['prediction'] == 'FAKE':
+            return jsonify({
+                "success": False,
+                "message": "Deepfake detected. Authentication failed.",
+                "details": deepfake_result,
+                "branch_seconds": branch_seconds
+            }), 401
 
-        if log_likelihood > threshold:
+        verification = results['speaker_verification']
+        if rejected_by is None:
             return jsonify({
                 "success": True,
                 "message": "Authentication Successful",
-                "score": log_likelihood,
-                "threshold": threshold
+                "score": verification['score'],
+                "llr": verification['llr'],
+                "threshold": verification['threshold'],
+                "reenrollment_required": reenrollment_required,
+                "vad": vad_stats,
+                "branch_seconds": branch_seconds
             }), 200
         else:
             return jsonify({
                 "success": False,
                 "message": "Voice verification failed. Voice did not match.",
-                "score": log_likelihood,
-                "threshold": threshold
+                "score": verification['score'],
+                "llr": verification['llr'],
+                "threshold": verification['threshold'],
+                "reenrollment_required": reenrollment_required,
+                "vad": vad_stats,
+                "branch_seconds": branch_seconds
             }), 401
 
     except Exception as e:
         logger.error(f"Error during login: {e}")
         return jsonify({"error": str(e)}), 500
 
+def stream_login(ws):
+    """
+    Login over a WebSocket, decided while the user is still speaking.
+
+    The client sends {"username": ...} as text and receives {"event": "ready",
+    "sample_rate": ...}. It then sends the recording as binary messages of
+    little-endian 16-bit mono PCM at that rate, and "end" as text when the
+    recording stops. The server answers with {"event": "progress", ...}
+    messages and finally one {"event": "result", "success": ...} message,
+    possibly long before the recording is over, and closes the socket.
+    """
+    def send(message):
+        ws.send(json.dumps(message))
+
+    try:
+        hello = ws.receive(timeout=STREAM_IDLE_SECONDS)
+        username = json.loads(hello).get('username') if isinstance(hello, str) else None
+        if not username:
+            send({"event": "error", "error": "Username is required"})
+            return
+
+        gmm_model, stats = find_speaker_model(username)
+        if gmm_model is None:
+            send({"event": "error", "error": "User not found. Please sign up first."})
+            return
+
+        model_rate = model_sample_rate(stats)
+        # Models enrolled on untrimmed samples keep being scored on the full clip
+        vad = default_detector if VAD_ENABLED and (stats is None or stats.get('vad', False)) else None
+        session = StreamingLoginSession(
+            username, gmm_model, adaptive_threshold(username, stats), model_rate,
+            detector=deepfake_detector.get(), vad=vad, normalization=model_normalization(stats),
+            evaluate_every=STREAM_EVALUATE_SECONDS, max_seconds=STREAM_MAX_SECONDS
+        )
+        send({"event": "ready", "sample_rate": model_rate, "format": "pcm_s16le",
+              "reenrollment_required": model_rate != DEFAULT_SAMPLE_RATE})
+
+        while not session.done:
+            data = ws.receive(timeout=STREAM_IDLE_SECONDS)
+            if data is None:
+                send({"event": "error", "error": "Timed out waiting for audio"})
+                return
+            message = session.finish() if isinstance(data, str) else session.push(data)
+            if message is not None:
+                send(message)
+
+    except Exception as e:
+        logger.error(f"Error during streaming login: {e}")
+        try:
+            send({"event": "error", "error": str(e)})
+        except Exception:
+            pass
+
+if sock is not None:
+    sock.route('/api/login/stream')(stream_login)
+
+def identify_group(ubm, legacy, features, group, top_k):
+    """
+    Rank the speakers of one group, all enrolled with the normalization and
+    sample rate `features` were extracted with.
+
+    :param group: dict of username -> model_stats.json contents, with the
+                  enrollment_mode of stored speakers taken from the store
+    :return: (candidates, usernames searched)
+    """
+    # Only MAP-adapted models can be scored under the UBM's alignment; EM
+    # models (and models predating ENROLLMENT_MODE) are scored exactly
+    aligned, exact = partition_speakers(group)
+    stored = set(model_store.usernames())
+    candidates, searched = [], set()
+    try:
+        candidates += model_store.identify(ubm, features, top_k=top_k, usernames=aligned & stored)
+        searched |= aligned & stored
+    except ValueError as e:
+        # A store built for another UBM cannot be scored under this one's alignment
+        logger.warning(f"Model store not searched: {e}")
+
+    # Pickled speakers; a speaker also in the store is scored from the store only
+    pickled = (aligned & set(legacy.usernames())) - stored
+    candidates += legacy.identify(features, top_k=top_k, usernames=pickled)
+    searched |= pickled
+
+    models = {}
+    for username in sorted(exact):
+        try:
+            model, _ = find_speaker_model(username)
+        except Exception as e:
+            logger.warning(f"Could not load the model of {username} for identification: {e}")
+            continue
+        if model is not None and model.n_features == ubm.n_features:
+            models[username] = model
+    candidates += exact_candidates(ubm, features, models, top_k)
+    searched |= set(models)
+    return candidates, searched
+
+@app.route('/api/identify', methods=['POST'])
+def identify():
+    """Rank all enrolled speakers for an utterance (1:N screening, e.g. duplicate-account checks)."""
+    try:
+        file = request.files.get('audio')
+        if not file:
+            return jsonify({"error": "Audio file is required"}), 400
+        try:
+            top_k = int(request.form.get('top_k', 5))
+        except ValueError:
+            top_k = 0
+        if top_k < 1:
+            return jsonify({"error": "top_k must be a positive integer"}), 400
+
+        data = file.read()
+        ubm = load_compact_ubm(UBM_MODEL_PATH)
+        legacy = legacy_speaker_index(ubm)
+        stored = set(model_store.usernames())
+        indexed = set(legacy.usernames())
+        speakers = stored | indexed | set(legacy.skipped)
+
+        # As in a login, each speaker is scored on features extracted the way
+        # they were enrolled, so the utterance is processed once per group of
+        # speakers sharing a normalization and sample rate (the pipeline's own
+        # settings always form a group, so the upload is checked either way)
+        modes = model_store.enrollment_modes()
+        groups = {(FEATURE_NORMALIZATION, DEFAULT_SAMPLE_RATE): {}}
+        for username in sorted(speakers):
+            stats = read_stats(os.path.join(DATA_DIR, username, "model_stats.json"), username) or {}
+            if username in stored:
+                # The store records the mode with the row; model_stats.json is written after it
+                stats = dict(stats, enrollment_mode=modes.get(username))
+            groups.setdefault((model_normalization(stats), model_sample_rate(stats)), {})[username] = stats
+
+        candidates, searched, usable = [], set(), False
+        decoded = {}
+        for (normalization, rate), group in groups.items():
+            if rate not in decoded:
+                audio = DecodedAudio.from_bytes(data, sr=rate)
+                decoded[rate] = trim_silence(audio) if VAD_ENABLED else (audio, None)
+            speech, _ = decoded[rate]
+            features = extract_features(speech.pcm16, speech.rate, normalization=normalization)
+            if features is None or len(features) == 0 or features.shape[1] != ubm.n_features:
+                if group:
+                    logger.warning(f"No usable features for the {len(group)} speakers enrolled with "
+                                   f"'{normalization}' features at {rate} Hz")
+                continue
+            usable = True
+            group_candidates, group_searched = identify_group(ubm, legacy, features, group, top_k)
+            candidates += group_candidates
+            searched |= group_searched
+        if not usable:
+            return jsonify({"error": "No usable speech in the audio"}), 400
+        not_searched = sorted(speakers - searched)
+        candidates = sorted(candidates, key=lambda c: c['llr'], reverse=True)[:top_k]
+        logger.info(f"Identification over {len(searched)} speakers ({len(not_searched)} not searched): {candidates[:1]}")
+
+        return jsonify({
+            "candidates": candidates,
+            "speakers": len(searched),
+            "not_searched": not_searched,
+            "vad": decoded[DEFAULT_SAMPLE_RATE][1]
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error during identification: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/send-otp', methods=['POST'])
 def send_otp():
     try:
@@ -315,23 +692,24 @@ def transfer():
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
+        vad_stats = None
         # Check if audio file is present
         if 'audio' in request.files:
             audio_file = request.files['audio']
             username = request.form.get('username')
             language = request.form.get('language', 'en-US')
             
-            # Save temp audio
-            user_dir = os.path.join(DATA_DIR, username)
-            os.makedirs(user_dir, exist_ok=True)
-            temp_path = os.path.join(user_dir, "chat_audio.wav")
-            audio_file.save(temp_path)
-            
             # Transcribe using ASR
-            if asr_service and asr_service.client:
-                text = asr_service.transcribe(temp_path, language)
+            asr = asr_service.get()
+            if asr and asr.client:
+                # Decode in memory and upload only the speech regions
+                audio = DecodedAudio.from_stream(audio_file.stream, sr=ASR_SAMPLE_RATE)
+                speech, vad_stats = trim_silence(audio) if VAD_ENABLED else (audio, None)
+                if vad_stats:
+                    logger.info(f"VAD for chat audio: kept {vad_stats['kept_fraction']:.0%} of {vad_stats['total_seconds']}s")
+                text = asr.transcribe_audio(speech, language)
                 logger.info(f"ASR Transcribed: {text}")
-            elif not asr_service:
+            elif not asr:
                 return jsonify({"error": "ASR service not available. Please restart the backend."}), 500
             else:
                 return jsonify({"error": "Sarvam AI API key not configured. Please add SARVAM_API_KEY to .env file and restart the server."}), 400
@@ -354,6 +732,8 @@ def chat():
         
         # Execute action if entities are present
         response_data = {"nlp": nlp_result, "transcription": text}
+        if vad_stats:
+            response_data['vad'] = vad_stats
         
         if nlp_result['intent'] == 'CHECK_BALANCE':
             user_data = get_user_data(username)
@@ -399,5 +779,11 @@ def chat():
         logger.error(f"Chat error: {e}")
         return jsonify({"error": str(e)}), 500
 
+record_timing('app_import', time.perf_counter() - import_started)
+# Under `python app.py`, every feature pool worker (forkserver or spawn) runs
+# this file again as __mp_main__; only the real app process loads the models
+if WARMUP_ON_START and __name__ != '__mp_main__':
+    warm_up_in_background()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
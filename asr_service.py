@@ -1,11 +1,28 @@
 import os
+import io
 import logging
-from sarvamai import SarvamAI
+import soundfile as sf
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rate speech is decoded at before upload; speech recognition runs on 16 kHz audio
+ASR_SAMPLE_RATE = 16000
+
+def encode_audio(audio):
+    """
+    Encode a DecodedAudio for upload: Ogg/Opus when libsndfile can write it
+    (a fraction of the size of PCM), 16-bit WAV otherwise.
+    Returns a (filename, bytes, content_type) tuple.
+    """
+    buffer = io.BytesIO()
+    if 'OPUS' in sf.available_subtypes('OGG') and audio.rate in (8000, 12000, 16000, 24000, 48000):
+        sf.write(buffer, audio.samples, audio.rate, format='OGG', subtype='OPUS')
+        return "speech.ogg", buffer.getvalue(), "audio/ogg"
+    sf.write(buffer, audio.samples, audio.rate, format='WAV', subtype='PCM_16')
+    return "speech.wav", buffer.getvalue(), "audio/wav"
+
 class IndicASR:
     def __init__(self):
         api_key = os.environ.get('SARVAM_API_KEY', 'sk_3m9fepx9_bPUfREeQoaYYwGYrVwLDWwWI')
@@ -16,6 +33,7 @@ class IndicASR:
             self.client = None
         else:
             try:
+                from sarvamai import SarvamAI
                 self.client = SarvamAI(api_subscription_key=api_key)
                 logger.info("Sarvam AI ASR initialized successfully.")
             except Exception as e:
@@ -27,6 +45,17 @@ class IndicASR:
         Transcribe audio file to text using Sarvam AI.
         language_code: 'hi-IN' for Hindi, 'en-US' for English, etc.
         """
+        with open(audio_path, 'rb') as audio_file:
+            return self._translate(audio_file, language_code)
+
+    def transcribe_audio(self, audio, language_code='hi'):
+        """
+        Transcribe a decoded utterance (typically already trimmed to speech)
+        without writing it to disk.
+        """
+        return self._translate(encode_audio(audio), language_code)
+
+    def _translate(self, file, language_code):
         if not self.client:
             logger.error("Sarvam AI client not initialized. Please set SARVAM_API_KEY.")
             return None
@@ -35,11 +64,10 @@ class IndicASR:
             logger.info(f"Transcribing audio with Sarvam AI (language: {language_code})")
             
             # Sarvam AI STT with translation to English
-            with open(audio_path, 'rb') as audio_file:
-                response = self.client.speech_to_text.translate(
-                    file=audio_file,
-                    model="saaras:v2.5"
-                )
+            response = self.client.speech_to_text.translate(
+                file=file,
+                model="saaras:v2.5"
+            )
             
             # Extract transcription from response
             transcription = response.transcript if hasattr(response, 'transcript') else str(response)
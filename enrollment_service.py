@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+class EnrollmentJob:
+    def __init__(self, job_id, username):
+        self.job_id = job_id
+        self.username = username
+        self.status = 'queued'
+        self.stage_name = None
+        self.stages = {}
+        self.result = None
+        self.error = None
+        self.created_at = str(datetime.datetime.now())
+        self.started_at = None
+        self.finished_at = None
+        self.on_change = None
+
+    @contextmanager
+    def stage(self, name):
+        """Time one enrollment stage and record it in the job status."""
+        self.stage_name = name
+        self._changed()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(time.perf_counter() - start_time, 4)
+            self.stage_name = None
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "username": self.username,
+            "status": self.status,
+            "stage": self.stage_name,
+            "stage_seconds": dict(self.stages),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class EnrollmentService:
+    """
+    Runs speaker enrollments in a bounded background executor.
+
+    Jobs move through queued -> running -> done | failed. Every state change
+    is also written to `jobs_dir`, so any worker process can answer a status
+    poll, not just the one that accepted the upload.
+
+    A user is claimed with an exclusive lock file in `jobs_dir` before their
+    samples are touched, so two worker processes never enroll the same user
+    at once. Lock files and queued or running jobs that have not changed for
+    `stale_after` seconds belong to a worker that died: the lock is broken
+    and the job reported as failed. Job files are deleted when their job is
+    evicted, or `stale_after` seconds after they last changed.
+    """
+
+    def __init__(self, enroll_fn, jobs_dir, max_workers=2, max_pending=100, max_jobs=1000,
+                 stale_after=3600, sweep_interval=60):
+        # enroll_fn(job, username) -> result dict; raises on failure
+        self.enroll_fn = enroll_fn
+        self.jobs_dir = jobs_dir
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.stale_after = stale_after
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='enrollment')
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _active(self):
+        return [job for job in self.jobs.values() if job.status in ('queued', 'running')]
+
+    def _claim_path(self, username):
+        return os.path.join(self.jobs_dir, f"{username}.lock")
+
+    def claim(self, username):
+        """
+        Reserve the user for one enrollment across all worker processes.
+
+        Returns False if another enrollment of the user holds the claim. The
+        claim is released when the submitted job finishes, or by release()
+        if no job is submitted.
+        """
+        path = self._claim_path(username)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) < self.stale_after:
+                        return False
+                    logger.warning(f"Breaking stale enrollment claim for {username}")
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"pid": os.getpid(), "claimed_at": str(datetime.datetime.now())}, f)
+            return True
+        return False
+
+    def release(self, username):
+        """Give up the claim taken by claim()."""
+        try:
+            os.remove(self._claim_path(username))
+        except FileNotFoundError:
+            pass
+
+    def submit(self, username):
+        """
+        Queue an enrollment of a user claimed with claim() and return its
+        job, or None if the queue is full (the claim is then kept).
+        """
+        with self.lock:
+            if len(self._active()) >= self.max_pending:
+                return None
+            job = EnrollmentJob(uuid.uuid4().hex, username)
+            job.on_change = self._persist
+            self.jobs[job.job_id] = job
+            evicted = []
+            while len(self.jobs) > self.max_jobs:
+                oldest = next(iter(self.jobs))
+                if self.jobs[oldest].status in ('queued', 'running'):
+                    break
+                evicted.append(self.jobs.pop(oldest).job_id)
+        for job_id in evicted:
+            self._remove_job_file(job_id)
+        self._sweep()
+        self._persist(job)
+        self.executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = str(datetime.datetime.now())
+        self._persist(job)
+        try:
+            job.result = self.enroll_fn(job, job.username)
+            job.status = 'done'
+            logger.info(f"Enrollment {job.job_id} for {job.username} finished: {job.stages}")
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+            logger.error(f"Enrollment {job.job_id} for {job.username} failed: {e}")
+        job.finished_at = str(datetime.datetime.now())
+        self._persist(job)
+        self.release(job.username)
+
+    def _job_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _remove_job_file(self, job_id):
+        try:
+            os.remove(self._job_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _sweep(self):
+        """Delete job files (of any worker) that have not changed for stale_after seconds."""
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        with self.lock:
+            own = set(self.jobs)
+        try:
+            with os.scandir(self.jobs_dir) as entries:
+                for entry in entries:
+                    job_id = entry.name[:-len('.json')]
+                    if not entry.name.endswith('.json') or job_id in own:
+                        continue
+                    try:
+                        if now - entry.stat().st_mtime >= self.stale_after:
+                            os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+        except OSError as e:
+            logger.warning(f"Failed to sweep enrollment jobs: {e}")
+
+    def _persist(self, job):
+        path = self._job_path(job.job_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(job.to_dict(), f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to persist enrollment job {job.job_id}: {e}")
+
+    def get_status(self, job_id):
+        """Return the job status dict, or None for an unknown job id."""
+        if not JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        try:
+            path = self._job_path(job_id)
+            with open(path, 'r') as f:
+                status = json.load(f)
+            updated = os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None
+        if status.get('status') in ('queued', 'running') and time.time() - updated >= self.stale_after:
+            # The worker running it died
+            status.update(status='failed', stage=None, error="Enrollment was interrupted")
+        return status
@@ -1,6 +1,9 @@
 import axios from 'axios';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:5001/api';
+const SIGNUP_POLL_INTERVAL_MS = 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
 
 export const signup = async (username, audioBlobs, email) => {
     const formData = new FormData();
@@ -10,9 +13,28 @@ export const signup = async (username, audioBlobs, email) => {
         formData.append('audio_samples', blob, `sample_${index}.wav`);
     });
 
-    return axios.post(`${API_URL}/signup`, formData, {
+    const response = await axios.post(`${API_URL}/signup`, formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
     });
+
+    // Enrollment runs in the background; poll until the model is ready
+    let job = response.data;
+    while (job.status === 'queued' || job.status === 'running') {
+        await sleep(SIGNUP_POLL_INTERVAL_MS);
+        job = (await getSignupStatus(job.job_id)).data;
+    }
+
+    if (job.status === 'failed') {
+        const error = new Error(job.error);
+        error.response = { data: { error: job.error } };
+        throw error;
+    }
+
+    return { ...response, data: job };
+};
+
+export const getSignupStatus = async (jobId) => {
+    return axios.get(`${API_URL}/signup/status/${jobId}`);
 };
 
 export const login = async (username, audioBlob) => {
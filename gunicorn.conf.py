@@ -0,0 +1,73 @@
+"""
+Gunicorn configuration for the backend (`gunicorn -c gunicorn.conf.py app:app`).
+
+The master imports the app and warms up every model before forking, so the
+workers share the model pages copy-on-write instead of each loading torch,
+Deep4SNet and the UBM. Native thread pools are not fork-safe: the master
+therefore runs single-threaded, and each worker sizes torch, BLAS and ONNX
+Runtime to its share of the CPUs after the fork.
+"""
+import os
+import gc
+
+def cpu_count():
+    """CPUs this process may run on (the container's quota, not the host's core count)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _flag(name, default):
+    return os.environ.get(name, default).lower() not in ('0', 'false', 'no')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Threads let concurrent logins in one worker share deepfake batches
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = _flag('GUNICORN_PRELOAD', '1')
+
+# Intra-op threads for each worker (torch, BLAS, ONNX Runtime and the feature pool)
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 0)) or max(1, cpu_count() // workers)
+
+# Read when the app and its native libraries are imported, i.e. after this file
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'ORT_THREADS')
+os.environ.setdefault('FEATURE_POOL_SIZE', str(WORKER_THREADS))
+if preload_app:
+    # Nothing may fork with live pool threads: the master stays single-threaded
+    # and post_fork raises each worker to its budget
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = '1'
+    # Warm-up runs synchronously in when_ready instead of on a background thread
+    os.environ['WARMUP_ON_START'] = '0'
+else:
+    # Every worker imports the libraries itself, already within its budget
+    for variable in THREAD_VARIABLES:
+        os.environ.setdefault(variable, str(WORKER_THREADS))
+
+def when_ready(server):
+    """Runs in the master once the preloaded app is imported, before the first fork."""
+    if not preload_app:
+        return
+    from startup import warm_up
+    report = warm_up()
+    for name, status in report['services'].items():
+        server.log.info(f"Preloaded {name}: {status['state']} in {status['load_seconds']}s"
+                        + (f", warm-up {status['warm_up_seconds']}s" if status['warm_up_seconds'] is not None else ""))
+    # Move everything allocated so far out of the collector's reach, so that
+    # collections in the workers do not touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    """Size the native thread pools of the new worker to its share of the CPUs."""
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(WORKER_THREADS)
+    except ImportError:
+        pass
+    if preload_app:
+        from startup import after_fork
+        after_fork(WORKER_THREADS)
+    server.log.info(f"Worker {worker.pid} uses {WORKER_THREADS} intra-op thread(s)")
@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError, as_completed
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class BranchCancelled(Exception):
+    """Raised by a branch's checkpoint once another branch has rejected the login."""
+
+class LoginPipeline:
+    """
+    Runs the independent checks of one login concurrently.
+
+    Deepfake detection and speaker verification only read the shared decoded
+    utterance, and both spend most of their time in numpy, scipy and torch
+    kernels that release the GIL, so on a bounded thread pool a login takes
+    as long as the slower branch rather than the sum of both.
+
+    Each branch is a callable taking a `checkpoint` function, which it calls
+    between its expensive steps. As soon as one branch's result rejects the
+    login, run() returns without waiting for the others, which are cancelled:
+    a branch that has not started yet never runs, and a running one raises
+    BranchCancelled at its next checkpoint.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Threads do not survive a fork (e.g. of a preloaded gunicorn master)
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='login-branch')
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, branches, rejects):
+        """
+        Run all branches and wait for them, stopping early on a rejection.
+
+        :param branches: dict of name -> fn(checkpoint) returning the branch result
+        :param rejects: fn(name, result) -> True if that result rejects the login
+        :return: (results, seconds, rejected_by). results maps every branch to
+                 its result, or None if it was cancelled; seconds maps each
+                 branch that finished to its wall time; rejected_by is the
+                 name of the first rejecting branch, or None
+        """
+        cancel = threading.Event()
+        seconds = {}
+
+        def checkpoint():
+            if cancel.is_set():
+                raise BranchCancelled()
+
+        def timed(name, fn):
+            start_time = time.perf_counter()
+            try:
+                checkpoint()
+                return fn(checkpoint)
+            finally:
+                seconds[name] = round(time.perf_counter() - start_time, 4)
+
+        def cancel_all():
+            cancel.set()
+            for future in futures:
+                future.cancel()
+
+        executor = self._get_executor()
+        futures = {executor.submit(timed, name, fn): name for name, fn in branches.items()}
+        results = {name: None for name in branches}
+        rejected_by = None
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except (BranchCancelled, CancelledError):
+                continue
+            except Exception:
+                cancel_all()
+                raise
+            results[name] = result
+            if rejects(name, result):
+                rejected_by = name
+                logger.info(f"Login branch {name} rejected; cancelling the others")
+                cancel_all()
+                break
+        # Cancelled branches may still be finishing; hand back a snapshot
+        return results, dict(seconds), rejected_by
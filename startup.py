@@ -0,0 +1,111 @@
+import time
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Named startup phases (e.g. the app module import) and their durations in seconds
+_timings = {}
+_services = {}
+_registry_lock = threading.Lock()
+
+class LazyService:
+    """
+    A subsystem that is built the first time it is needed, once per process.
+
+    `factory` builds the instance (and should do the heavy imports itself);
+    the optional `warm_up` callable runs one dummy inference on it, and the
+    optional `after_fork(instance, num_threads)` re-creates per-process state
+    (thread pools) in a forked worker. A factory that raises is logged and not
+    retried: get() then returns None, the way the app treats a subsystem that
+    failed to initialize.
+    """
+
+    def __init__(self, name, factory, warm_up=None, after_fork=None):
+        self.name = name
+        self.factory = factory
+        self.warm_up_fn = warm_up
+        self.after_fork_fn = after_fork
+        self.instance = None
+        self.state = 'unloaded'
+        self.error = None
+        self.load_seconds = None
+        self.warm_up_seconds = None
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _services[name] = self
+
+    def get(self):
+        """Return the instance, building it on first use; None if it failed to build."""
+        if self.state == 'unloaded':
+            with self._lock:
+                if self.state == 'unloaded':
+                    start = time.perf_counter()
+                    try:
+                        self.instance = self.factory()
+                        self.state = 'ready'
+                        logger.info(f"{self.name} initialized successfully.")
+                    except Exception as e:
+                        self.error = str(e)
+                        self.state = 'failed'
+                        logger.error(f"Failed to initialize {self.name}: {e}")
+                    self.load_seconds = round(time.perf_counter() - start, 3)
+        return self.instance
+
+    def warm_up(self):
+        """Build the instance and run the warm-up inference once."""
+        instance = self.get()
+        if instance is None or self.warm_up_fn is None or self.warm_up_seconds is not None:
+            return
+        start = time.perf_counter()
+        try:
+            self.warm_up_fn(instance)
+        except Exception as e:
+            logger.warning(f"Warm-up of {self.name} failed: {e}")
+        self.warm_up_seconds = round(time.perf_counter() - start, 3)
+
+    def status(self):
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "warm_up_seconds": self.warm_up_seconds,
+            "error": self.error
+        }
+
+def record_timing(name, seconds):
+    """Record how long a startup phase took."""
+    _timings[name] = round(seconds, 3)
+
+def warm_up(names=None):
+    """Build and warm up the named services (all registered ones by default); returns startup_report()."""
+    with _registry_lock:
+        services = [s for s in _services.values() if names is None or s.name in names]
+    for service in services:
+        service.warm_up()
+    return startup_report()
+
+def warm_up_in_background(names=None):
+    """Warm up without delaying the caller, e.g. so /health answers while models load."""
+    thread = threading.Thread(target=warm_up, args=(names,), name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def after_fork(num_threads):
+    """Give every built service that needs it a chance to size its thread pools in a forked worker."""
+    with _registry_lock:
+        services = [s for s in _services.values() if s.instance is not None and s.after_fork_fn is not None]
+    for service in services:
+        try:
+            service.after_fork_fn(service.instance, num_threads)
+        except Exception as e:
+            logger.warning(f"Re-initializing {service.name} after fork failed: {e}")
+
+def startup_report():
+    """Per-subsystem load and warm-up times, plus the recorded startup phases."""
+    with _registry_lock:
+        services = dict(_services)
+    return {
+        "timings": dict(_timings),
+        "services": {name: service.status() for name, service in services.items()}
+    }
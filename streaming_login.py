@@ -0,0 +1,143 @@
+import time
+import logging
+import numpy as np
+from voiceauth.streaming import StreamingFeatureExtractor, SequentialTest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class StreamingLoginSession:
+    """
+    One login whose audio arrives while the user is still speaking.
+
+    Raw little-endian int16 PCM at the speaker model's rate is fed to push()
+    as it is recorded. Every `evaluate_every` seconds of new audio the speech
+    so far is scored against the speaker model and a SequentialTest decides
+    whether the evidence is already conclusive; a confident accept is only
+    granted once the deepfake detector, run on the histogram accumulated so
+    far, calls the audio real. finish() ends the recording and decides with
+    the batch rule if the test never became confident.
+    """
+
+    def __init__(self, username, gmm_model, threshold, rate, detector=None, vad=None,
+                 test=None, evaluate_every=0.25, max_seconds=15.0, normalization=None):
+        """
+        :param username: user logging in (for logs)
+        :param gmm_model: speaker model with score_samples()
+        :param threshold: acceptance threshold on the mean log-likelihood
+        :param rate: sample rate of the stream, which must be the model's rate
+        :param detector: DeepfakeDetector, or None to skip deepfake detection
+        :param vad: VoiceActivityDetector for models enrolled on trimmed audio, or None
+        :param test: SequentialTest (default: one configured from the environment)
+        :param evaluate_every: seconds of new audio between two evaluations
+        :param max_seconds: recording length after which the login is decided regardless
+        :param normalization: feature normalization the model was enrolled with
+        """
+        self.username = username
+        self.gmm_model = gmm_model
+        self.threshold = threshold
+        self.detector = detector
+        self.test = test or SequentialTest()
+        self.evaluate_samples = max(1, int(evaluate_every * rate))
+        self.max_samples = int(max_seconds * rate)
+        self.extractor = StreamingFeatureExtractor(rate, detector=vad, histogram=detector is not None,
+                                                   normalization=normalization)
+        self.result = None
+        # Frame scores that later audio cannot change, and the frames they belong to
+        self._final_scores = np.empty(0)
+        self._final_frames = np.empty(0, dtype=np.intp)
+        self._leftover = b''
+        self._evaluated_samples = 0
+        self._started = time.perf_counter()
+
+    @property
+    def done(self):
+        return self.result is not None
+
+    def push(self, data):
+        """
+        Feed the next chunk of the recording.
+
+        :param data: bytes of little-endian int16 PCM (a chunk may split a sample)
+        :return: a progress or result message when the chunk led to an
+                 evaluation, otherwise None
+        """
+        if self.done:
+            return self.result
+        data = self._leftover + data
+        usable = len(data) - len(data) % 2
+        self._leftover = data[usable:]
+        self.extractor.push(np.frombuffer(data[:usable], dtype='<i2'))
+
+        if self.extractor.num_samples >= self.max_samples:
+            return self.finish()
+        if self.extractor.num_samples - self._evaluated_samples >= self.evaluate_samples:
+            return self.evaluate()
+        return None
+
+    def finish(self):
+        """End of the recording: decide on everything received."""
+        if self.done:
+            return self.result
+        self.extractor.finish()
+        return self.evaluate(final=True)
+
+    def evaluate(self, final=False):
+        """Score the speech so far and decide if the sequential test (or `final`) allows it."""
+        self._evaluated_samples = self.extractor.num_samples
+        mask = self.extractor.speech_mask()
+        features = self.extractor.features(mask)
+        if features is None:
+            if final:
+                self.result = self._message('result', success=False, message="No audio received.")
+            return self.result
+
+        verdict = self.test.decide(self.frame_scores(mask, features), self.threshold,
+                                   self.extractor.frame_seconds, final=final)
+        if verdict['decision'] is None:
+            return self._message('progress', **verdict)
+
+        deepfake_result = None
+        if verdict['decision'] == 'accept' and self.detector is not None:
+            deepfake_result = self.detector.predict_histogram(self.extractor.histogram_counts(mask))
+            if deepfake_result is None:
+                logger.warning("Deepfake detection returned None")
+
+        if deepfake_result and deepfake_result['prediction'] == 'FAKE':
+            success, message = False, "Deepfake detected. Authentication failed."
+        elif verdict['decision'] == 'accept':
+            success, message = True, "Authentication Successful"
+        else:
+            success, message = False, "Voice verification failed. Voice did not match."
+
+        self.result = self._message('result', success=success, message=message, early=not final,
+                                    deepfake=deepfake_result, **verdict)
+        logger.info(f"Streaming login for {self.username}: {message} after {self.result['seconds']}s "
+                    f"(score {verdict['score']:.2f}, threshold {self.threshold:.2f})")
+        return self.result
+
+    def frame_scores(self, mask, features):
+        """
+        Per-frame log-likelihoods of `features`, scoring only the rows that
+        changed since the last evaluation. Scores stay valid as long as the
+        speech mask keeps the frames they were computed on.
+        """
+        frames = np.flatnonzero(mask)
+        reused = len(self._final_frames)
+        if reused > len(frames) or not np.array_equal(frames[:reused], self._final_frames):
+            reused = 0
+        scores = np.concatenate([self._final_scores[:reused], self.gmm_model.score_samples(features[reused:])])
+
+        final = self.extractor.final_rows(len(features))
+        self._final_scores = scores[:final]
+        self._final_frames = frames[:final]
+        return scores
+
+    def _message(self, event, **fields):
+        return {
+            "event": event,
+            "seconds": round(self.extractor.seconds, 3),
+            "threshold": self.threshold,
+            "elapsed_seconds": round(time.perf_counter() - self._started, 3),
+            **fields
+        }
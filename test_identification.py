@@ -0,0 +1,71 @@
+import numpy as np
+from voiceauth.scoring import CompactGMM
+from voiceauth.identification import SpeakerIndex, partition_speakers, exact_candidates
+from voiceauth.model_store import ModelStore
+
+K, D = 4, 3
+rng = np.random.default_rng(0)
+
+# Well separated UBM components, so MAP speakers differ from it only slightly
+ubm = CompactGMM(10.0 * rng.normal(size=(K, D)), np.ones((K, D)), np.full(K, 1.0 / K))
+
+def map_speaker(shift):
+    """Mean-only MAP adaptation of the UBM: same components, in the same order."""
+    return CompactGMM(ubm.means + shift, ubm.precisions, ubm.weights)
+
+def em_speaker(shift):
+    """An EM refit seeded from the UBM: the components come out in another order."""
+    order = np.roll(np.arange(K), 1)
+    return CompactGMM(ubm.means[order] + shift, ubm.precisions[order], ubm.weights[order])
+
+def sample(model, n=400):
+    components = rng.choice(model.n_components, size=n, p=model.weights / model.weights.sum())
+    return model.means[components] + rng.normal(size=(n, D)) / np.sqrt(model.precisions[components])
+
+speakers = {f"map{i}": map_speaker(0.8 * rng.normal(size=D)) for i in range(5)}
+utterances = {username: sample(model) for username, model in speakers.items()}
+
+def test_fixed_alignment_ranking_matches_exact_scoring(tmp_path):
+    index = SpeakerIndex(ubm)
+    store = ModelStore(str(tmp_path / 'store'))
+    for username, model in speakers.items():
+        index.add(username, model)
+        store.put(username, model, enrollment_mode='map')
+
+    for username, X in utterances.items():
+        exact = exact_candidates(ubm, X, speakers, top_k=len(speakers))
+        assert exact[0]['username'] == username
+        for fixed in (index.identify(X, top_k=len(speakers)), store.identify(ubm, X, top_k=len(speakers))):
+            assert [c['username'] for c in fixed] == [c['username'] for c in exact]
+            np.testing.assert_allclose([c['llr'] for c in fixed], [c['llr'] for c in exact], atol=0.05)
+
+def test_em_models_are_scored_exactly():
+    em = em_speaker(np.zeros(D))
+    stats = {"map0": {"enrollment_mode": "map"}, "em0": {"enrollment_mode": "em"}, "legacy": None}
+    aligned, exact = partition_speakers(stats)
+    assert aligned == {"map0"}
+    assert exact == {"em0", "legacy"}
+
+    # Under the UBM alignment the EM model ranks last for its own speech
+    X = sample(em)
+    index = SpeakerIndex(ubm)
+    index.add("em0", em)
+    index.add("map0", speakers["map0"])
+    assert index.identify(X, top_k=2)[-1]['username'] == "em0"
+    assert [c['username'] for c in index.identify(X, top_k=2, usernames=aligned)] == ["map0"]
+    exact = exact_candidates(ubm, X, {"em0": em, "map0": speakers["map0"]}, top_k=2)
+    assert exact[0]['username'] == "em0"
+
+def test_store_skips_rows_not_enrolled_with_map(tmp_path):
+    store = ModelStore(str(tmp_path / 'store'))
+    store.put("map0", speakers["map0"], enrollment_mode='map')
+    store.put("em0", em_speaker(np.zeros(D)), enrollment_mode='em')
+    store.put("imported", speakers["map1"])
+    assert store.enrollment_modes() == {"map0": "map", "em0": "em"}
+
+    candidates = store.identify(ubm, utterances["map1"], top_k=3)
+    assert [c['username'] for c in candidates] == ["map0"]
+
+    # Re-enrolling with EM takes the speaker out of the aligned search
+    store.put("map0", em_speaker(np.zeros(D)), enrollment_mode='em')
+    assert store.identify(ubm, utterances["map0"], top_k=3) == []
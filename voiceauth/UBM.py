@@ -2,63 +2,91 @@ import numpy as np
 import logging
 from sklearn.mixture import GaussianMixture
 import joblib
-from scipy.io import wavfile
-from feature_extraction import extract_features  # Importing the feature extraction function
+from voiceauth.feature_extraction import extract_features, FEATURE_DTYPE, FEATURE_NORMALIZATION  # Importing the feature extraction function
+from voiceauth.frontend import get_frontend
+from voiceauth.cmvn import CmvnStats, CMVN_STATS_PATH
+from voiceauth.audio import DecodedAudio, DEFAULT_SAMPLE_RATE
+from voiceauth.vad import VAD_ENABLED, trim_silence
+from voiceauth import worker_pool
+from voiceauth.logging_setup import configure_logging
 from tqdm import tqdm  # Import tqdm for progress bar
 import time
-from multiprocessing import Pool
 import os
 
 # Configure logging for the main script as well (if not already done)
-logging.basicConfig(filename='process.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging()
+logger = logging.getLogger(__name__)
 
 def process_file(file_path):
-    """Process a single WAV file and extract features."""
+    """Process a single WAV file and extract features at the canonical sample rate."""
     try:
-        rate, audio = wavfile.read(file_path)
-        logging.info(f"Successfully read file: {os.path.basename(file_path)} with sample rate: {rate}")
+        decoded = DecodedAudio.from_file(file_path, sr=DEFAULT_SAMPLE_RATE)
+        if VAD_ENABLED:
+            decoded, _ = trim_silence(decoded)
+        audio, rate = decoded.pcm16, decoded.rate
+        logger.debug("Successfully read file: %s with sample rate: %s", os.path.basename(file_path), rate)
         
         features = extract_features(audio, rate)
         
         if features is not None:
-            logging.info(f"Features extracted from {os.path.basename(file_path)}: shape {features.shape}")
+            logger.debug("Features extracted from %s: shape %s", os.path.basename(file_path), features.shape)
         
         return features
     
     except Exception as e:
-        logging.error(f"Error reading file {file_path}: {e}")
+        logger.error("Error reading file %s: %s", file_path, e)
         return None
 
+def process_file_cmvn_stats(file_path):
+    """CMVN statistics of the raw MFCCs of a single WAV file, decoded and trimmed as in process_file."""
+    try:
+        decoded = DecodedAudio.from_file(file_path, sr=DEFAULT_SAMPLE_RATE)
+        if VAD_ENABLED:
+            decoded, _ = trim_silence(decoded)
+        return CmvnStats.from_frames(get_frontend(decoded.rate, dtype=FEATURE_DTYPE).mfcc(decoded.pcm16))
+
+    except Exception as e:
+        logger.error("Error reading file %s: %s", file_path, e)
+        return None
+
+def compute_cmvn_stats(directory):
+    """Global CMVN statistics over the raw MFCCs of all WAV files in the directory."""
+    wav_files = [f for f in os.listdir(directory) if f.endswith('.wav')]
+    stats = CmvnStats()
+    for file_stats in tqdm(worker_pool.imap(process_file_cmvn_stats, [os.path.join(directory, f) for f in wav_files]), total=len(wav_files)):
+        if file_stats is not None:
+            stats = stats + file_stats
+    return stats
+
 def load_features_from_directory(directory):
     """Load all extracted features from WAV files in the specified directory."""
     features_list = []
     
     # List all WAV files in the directory
     wav_files = [f for f in os.listdir(directory) if f.endswith('.wav')]
-    logging.info(f"Found {len(wav_files)} WAV files in '{directory}'.")
+    logger.info("Found %d WAV files in '%s'.", len(wav_files), directory)
 
-    # Use multiprocessing to extract features in parallel
-    with Pool() as pool:
-        results = list(tqdm(pool.imap(process_file, [os.path.join(directory, f) for f in wav_files]), total=len(wav_files)))
+    # Extract features in parallel on the shared worker pool
+    results = list(tqdm(worker_pool.imap(process_file, [os.path.join(directory, f) for f in wav_files]), total=len(wav_files)))
 
     # Filter out None results and concatenate features
     features_list = [result for result in results if result is not None]
     
     if features_list:
         all_features = np.vstack(features_list)
-        logging.info(f"Total features concatenated: {all_features.shape}")
+        logger.info("Total features concatenated: %s", all_features.shape)
         return all_features
     else:
-        logging.warning("No features were loaded. Please check your audio files.")
+        logger.warning("No features were loaded. Please check your audio files.")
         return np.array([])
 
 def train_ubm(features, n_components=64, max_iter=200, patience=10):
     """Train a Universal Background Model (UBM) using GMM with early stopping."""
-    logging.info("Initializing Gaussian Mixture Model for UBM training.")
+    logger.info("Initializing Gaussian Mixture Model for UBM training.")
     
     ubm_model = GaussianMixture(n_components=n_components, covariance_type='diag', max_iter=max_iter)
     
-    logging.info("Fitting the UBM model to the extracted features...")
+    logger.info("Fitting the UBM model to the extracted features...")
     
     start_time = time.time()  # Start timing
     best_log_likelihood = -np.inf
@@ -68,7 +96,7 @@ def train_ubm(features, n_components=64, max_iter=200, patience=10):
         ubm_model.fit(features)
         current_log_likelihood = ubm_model.score(features) * len(features)  # Total log likelihood
         
-        logging.info(f"Iteration {iteration + 1}/{max_iter}, Log Likelihood: {current_log_likelihood:.2f}")
+        logger.info("Iteration %d/%d, Log Likelihood: %.2f", iteration + 1, max_iter, current_log_likelihood)
         
         # Check for improvement
         if current_log_likelihood > best_log_likelihood:
@@ -79,40 +107,54 @@ def train_ubm(features, n_components=64, max_iter=200, patience=10):
         
         # Check for early stopping
         if no_improvement_count >= patience:
-            logging.info("Early stopping triggered.")
+            logger.info("Early stopping triggered.")
             break
     
     elapsed_time = time.time() - start_time  # Calculate elapsed time
-    logging.info(f"UBM model training completed successfully in {elapsed_time:.2f} seconds.")
+    logger.info("UBM model training completed successfully in %.2f seconds.", elapsed_time)
     
     return ubm_model
 
 if __name__ == "__main__":
+    # Run from the repository root: python -m voiceauth.UBM
     # Directory containing WAV files for UBM training
     feature_directory = "Data/selected_wav"  # Update with your actual path
 
+    # Normalization statistics of the corpus come first: the features the UBM
+    # is trained on are already normalized with them
+    if FEATURE_NORMALIZATION == 'cmvn_global':
+        logger.info('Computing global CMVN statistics...')
+        cmvn_stats = compute_cmvn_stats(feature_directory)
+        if cmvn_stats.count == 0:
+            logger.error("No frames for CMVN statistics. Exiting.")
+            exit(1)
+        cmvn_stats.save(CMVN_STATS_PATH)
+        logger.info("Global CMVN statistics over %d frames saved at %s.", cmvn_stats.count, CMVN_STATS_PATH)
+
     # Load features from directory using the separate module
-    logging.info('Starting feature loading...')
+    logger.info('Starting feature loading...')
     all_features = load_features_from_directory(feature_directory)
 
     if all_features.size == 0:
-        logging.error("No features loaded. Exiting.")
+        logger.error("No features loaded. Exiting.")
         exit(1)
 
-    logging.info(f"Total features loaded: {all_features.shape}")
+    logger.info("Total features loaded: %s", all_features.shape)
 
     # Train UBM
     n_components = 32  
-    logging.info("Starting UBM training...")
+    logger.info("Starting UBM training...")
     
     ubm_model = train_ubm(all_features, n_components)
+    ubm_model.sample_rate_ = DEFAULT_SAMPLE_RATE  # Checked against the pipeline rate at load time
+    ubm_model.feature_normalization_ = FEATURE_NORMALIZATION  # ... and so is the feature normalization
 
     # Save the trained UBM model
-    model_path = 'model/ubm_model.pkl'
+    model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model', 'ubm_model.pkl')
     
     try:
         joblib.dump(ubm_model, model_path)
-        logging.info(f"UBM model trained and saved successfully at {model_path}.")
+        logger.info("UBM model trained and saved successfully at %s.", model_path)
         
     except Exception as e:
-        logging.error(f"Error saving UBM model: {e}")
\ No newline at end of file
+        logger.error("Error saving UBM model: %s", e)
\ No newline at end of file
@@ -0,0 +1,67 @@
+import os
+import numpy as np
+from voiceauth.decoding import decode_bytes, decode_file, decode_stream
+
+# Rate every model was trained at before the canonical rate became configurable
+LEGACY_SAMPLE_RATE = 44100
+
+# Canonical sample rate used by enrollment, UBM training, verification and
+# the deepfake histogram (AUDIO_SAMPLE_RATE, e.g. 16000)
+DEFAULT_SAMPLE_RATE = int(os.environ.get('AUDIO_SAMPLE_RATE', LEGACY_SAMPLE_RATE))
+
+class DecodedAudio:
+    """
+    An utterance decoded once and shared between all processing stages.
+
+    The PCM lives in a single read-only float32 buffer in [-1, 1] (the layout
+    librosa.load returns). Stages receive views of that buffer instead of
+    decoding the file again; the int16 representation used for feature
+    extraction is derived from it at most once.
+    """
+
+    def __init__(self, samples, rate):
+        samples = np.asarray(samples, dtype=np.float32).view()
+        samples.flags.writeable = False
+        self._samples = samples
+        self._pcm16 = None
+        self.rate = rate
+
+    @classmethod
+    def from_file(cls, file_path, sr=DEFAULT_SAMPLE_RATE):
+        """Decode an audio file into mono float32 PCM; the format is sniffed from its contents."""
+        audio, rate = decode_file(file_path, sr)
+        return cls(audio, rate)
+
+    @classmethod
+    def from_bytes(cls, data, sr=DEFAULT_SAMPLE_RATE):
+        """Decode an in-memory recording into mono float32 PCM."""
+        audio, rate = decode_bytes(data, sr)
+        return cls(audio, rate)
+
+    @classmethod
+    def from_stream(cls, stream, sr=DEFAULT_SAMPLE_RATE):
+        """Decode an uploaded file straight from its request stream, without a temp file."""
+        audio, rate = decode_stream(stream, sr)
+        return cls(audio, rate)
+
+    @property
+    def samples(self):
+        """Read-only float32 view of the decoded signal."""
+        return self._samples
+
+    @property
+    def pcm16(self):
+        """Read-only int16 copy of the signal, matching the scaling used at enrollment."""
+        if self._pcm16 is None:
+            pcm16 = (self._samples * 32768).astype(np.int16)
+            pcm16.flags.writeable = False
+            self._pcm16 = pcm16
+        return self._pcm16
+
+    @property
+    def duration(self):
+        """Length of the utterance in seconds."""
+        return len(self._samples) / self.rate if self.rate else 0.0
+
+    def __len__(self):
+        return len(self._samples)
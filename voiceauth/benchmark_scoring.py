@@ -0,0 +1,68 @@
+import time
+import argparse
+import numpy as np
+import joblib
+from sklearn.mixture import GaussianMixture
+from voiceauth.scoring import CompactGMM, score_top_c, TOP_C
+
+def random_gmm(n_components, n_features, seed=0):
+    """A fitted-looking diagonal sklearn GaussianMixture with random parameters."""
+    rng = np.random.default_rng(seed)
+    gmm = GaussianMixture(n_components=n_components, covariance_type='diag')
+    gmm.weights_ = rng.dirichlet(np.ones(n_components))
+    gmm.means_ = rng.normal(0, 1, (n_components, n_features))
+    gmm.covariances_ = rng.uniform(0.05, 2.0, (n_components, n_features))
+    gmm.precisions_ = 1 / gmm.covariances_
+    gmm.precisions_cholesky_ = np.sqrt(gmm.precisions_)
+    gmm.converged_ = True
+    gmm.n_features_in_ = n_features
+    return gmm
+
+def time_call(func, X, repeats):
+    """Best-of-`repeats` wall time of func(X), in milliseconds."""
+    func(X)
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(X)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def benchmark(gmm, X, repeats=20, top_c=TOP_C):
+    """Time sklearn, CompactGMM and top-C scoring of X and report their agreement."""
+    results = {'sklearn_ms': time_call(gmm.score, X, repeats)}
+    reference = gmm.score_samples(X)
+    for dtype in (np.float32, np.float64):
+        compact = CompactGMM.from_sklearn(gmm, dtype=dtype)
+        name = np.dtype(dtype).name
+        results[f'{name}_ms'] = time_call(compact.score, X, repeats)
+        results[f'{name}_max_abs_error'] = float(np.abs(compact.score_samples(X) - reference).max())
+    # Top-C timing only: the model stands in for both the UBM and the speaker
+    compact = CompactGMM.from_sklearn(gmm)
+    results['top_c_ms'] = time_call(lambda X: score_top_c(compact, compact, X, top_c), X, repeats)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CompactGMM scoring against sklearn GaussianMixture.score.")
+    parser.add_argument('--model', help="score against this .gmm file instead of random models")
+    parser.add_argument('--components', type=int, nargs='+', default=[32, 256, 1024])
+    parser.add_argument('--features', type=int, default=40, help="feature dimension (MFCC + deltas)")
+    parser.add_argument('--frames', type=int, default=500, help="frames per utterance (~5 s)")
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--top-c', type=int, default=TOP_C, help="components per frame for top-C scoring")
+    args = parser.parse_args()
+
+    if args.model:
+        model = joblib.load(args.model)
+        models = [model]
+        n_features = model.means_.shape[1]
+    else:
+        models = [random_gmm(k, args.features) for k in args.components]
+        n_features = args.features
+    X = np.random.default_rng(1).normal(0, 1, (args.frames, n_features))
+
+    print(f"{'K':>6} {'sklearn':>10} {'float32':>10} {'float64':>10} {'speedup':>8} {'top-C':>10} {'f32 err':>10} {'f64 err':>10}")
+    for gmm in models:
+        r = benchmark(gmm, X, args.repeats, args.top_c)
+        print(f"{gmm.n_components:>6} {r['sklearn_ms']:>8.3f}ms {r['float32_ms']:>8.3f}ms {r['float64_ms']:>8.3f}ms "
+              f"{r['sklearn_ms'] / r['float32_ms']:>7.1f}x {r['top_c_ms']:>8.3f}ms {r['float32_max_abs_error']:>10.2e} {r['float64_max_abs_error']:>10.2e}")
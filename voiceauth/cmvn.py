@@ -0,0 +1,130 @@
+"""
+Cepstral mean and variance normalization (CMVN).
+
+An alternative to fitting a VarianceThreshold and a RobustScaler on every
+utterance: each frame is normalized with the mean and variance of a sliding
+window of the frames up to and including it, computed for all frames at
+once from cumulative sums. The output always has the input's dimensionality,
+and a frame's value never depends on later audio (apart from the first
+`min_window` frames), so a streaming login can score frames as they arrive.
+
+Optionally, statistics gathered once over the UBM training corpus are
+blended into every window as `prior_frames` pseudo-frames. This stabilizes
+the first frames of an utterance and removes the need to look ahead.
+"""
+import os
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sliding window and look-ahead (without global statistics) in frames of 10 ms
+CMVN_WINDOW = int(os.environ.get('CMVN_WINDOW', 300))
+CMVN_MIN_WINDOW = int(os.environ.get('CMVN_MIN_WINDOW', 100))
+# Weight of the global statistics, in frames
+CMVN_PRIOR_FRAMES = float(os.environ.get('CMVN_PRIOR_FRAMES', 100))
+# Global statistics are written next to the UBM by `python -m voiceauth.UBM`
+CMVN_STATS_PATH = os.environ.get(
+    'CMVN_STATS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model', 'ubm_cmvn.npz'))
+
+VARIANCE_FLOOR = 1e-10
+
+class CmvnStats:
+    """Frame count, per-coefficient sum and sum of squares of raw MFCCs; stats of several files add up."""
+
+    def __init__(self, count=0, total=None, total_sq=None):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+
+    @classmethod
+    def from_frames(cls, frames):
+        frames = np.asarray(frames, dtype=np.float64)
+        return cls(len(frames), frames.sum(axis=0), np.square(frames).sum(axis=0))
+
+    def __add__(self, other):
+        if self.total is None:
+            return other
+        if other.total is None:
+            return self
+        return CmvnStats(self.count + other.count, self.total + other.total, self.total_sq + other.total_sq)
+
+    @property
+    def mean(self):
+        return self.total / self.count
+
+    @property
+    def variance(self):
+        return np.maximum(self.total_sq / self.count - np.square(self.mean), VARIANCE_FLOOR)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, count=self.count, total=self.total, total_sq=self.total_sq)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(int(data['count']), data['total'], data['total_sq'])
+
+_global_stats = {}
+_global_stats_lock = threading.Lock()
+
+def load_global_stats(path=CMVN_STATS_PATH):
+    """Corpus statistics, loaded once per process and again only when the file changes."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise ValueError(f"No global CMVN statistics at {path}; train the UBM with FEATURE_NORMALIZATION=cmvn_global first")
+    signature = (st.st_mtime_ns, st.st_size)
+    with _global_stats_lock:
+        cached = _global_stats.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, CmvnStats.load(path))
+            _global_stats[path] = cached
+            logger.info(f"Loaded global CMVN statistics over {cached[1].count} frames from {path}")
+        return cached[1]
+
+def online_cmvn(mfcc_feat, global_stats=None, window=CMVN_WINDOW, min_window=CMVN_MIN_WINDOW,
+                prior_frames=CMVN_PRIOR_FRAMES):
+    """
+    Normalize every frame with the statistics of the `window` frames ending at it.
+
+    :param mfcc_feat: (NUMFRAMES, numcep) MFCC array
+    :param global_stats: CmvnStats of the training corpus, blended in as
+                         `prior_frames` frames; None to use the utterance alone,
+                         in which case the first `min_window` frames share the
+                         statistics of the first `min_window` frames
+    :param window: sliding window length in frames
+    :param min_window: frames of look-ahead at the start of an utterance
+    :param prior_frames: weight of `global_stats` in frames
+    :return: array of the same shape and dtype as `mfcc_feat`
+    """
+    frames = np.asarray(mfcc_feat, dtype=np.float64)
+    num_frames = len(frames)
+    if num_frames == 0:
+        return np.asarray(mfcc_feat).copy()
+
+    zeros = np.zeros((1, frames.shape[1]))
+    cumulative = np.concatenate([zeros, np.cumsum(frames, axis=0)])
+    cumulative_sq = np.concatenate([zeros, np.cumsum(np.square(frames), axis=0)])
+
+    end = np.arange(1, num_frames + 1)
+    if global_stats is None:
+        end = np.maximum(end, min(min_window, num_frames))
+    start = np.maximum(end - window, 0)
+    count = (end - start)[:, np.newaxis].astype(np.float64)
+    total = cumulative[end] - cumulative[start]
+    total_sq = cumulative_sq[end] - cumulative_sq[start]
+    if global_stats is not None:
+        count = count + prior_frames
+        total = total + prior_frames * global_stats.mean
+        total_sq = total_sq + prior_frames * (global_stats.variance + np.square(global_stats.mean))
+
+    mean = total / count
+    variance = np.maximum(total_sq / count - np.square(mean), VARIANCE_FLOOR)
+    return ((frames - mean) / np.sqrt(variance)).astype(np.asarray(mfcc_feat).dtype)
+
+def lookahead_frames(use_global_stats=False, min_window=CMVN_MIN_WINDOW):
+    """Frames an utterance needs before online_cmvn's output for its first frame is final."""
+    return 0 if use_global_stats else min_window
@@ -0,0 +1,149 @@
+"""
+In-process decoding of uploaded recordings.
+
+Browsers record with MediaRecorder, which produces webm/Opus (Chrome) or
+Ogg/Opus (Firefox) regardless of the file name the frontend uploads under.
+The container is identified from its leading bytes: WAV, FLAC and Ogg are
+decoded from memory by libsndfile (soundfile), webm/Matroska, MP4 and MP3 by
+FFmpeg's libraries through PyAV. Only when neither can handle the data does
+decoding fall back to librosa/audioread, which spawns an ffmpeg subprocess.
+
+Every path yields the same layout librosa.load produces: mono float32 in
+[-1, 1], resampled to the requested rate with soxr_hq.
+"""
+import io
+import os
+import logging
+import tempfile
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Containers decoded in-process by libsndfile
+SOUNDFILE_CONTAINERS = ('wav', 'flac', 'ogg')
+
+# Containers decoded in-process by PyAV, when it is installed
+AV_CONTAINERS = ('webm', 'mp4', 'mp3')
+
+# Enough leading bytes to identify every supported container
+SNIFF_BYTES = 12
+
+def sniff_container(header):
+    """
+    Identify an audio container from its magic bytes.
+
+    :param header: the first bytes of the file (at least SNIFF_BYTES)
+    :return: one of SOUNDFILE_CONTAINERS / AV_CONTAINERS, or None if unknown
+    """
+    if header[:4] in (b'RIFF', b'RF64') and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'\x1a\x45\xdf\xa3':  # EBML, used by webm and Matroska
+        return 'webm'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    if header[:4] == b'fLaC':
+        return 'flac'
+    if header[4:8] == b'ftyp':
+        return 'mp4'
+    if header[:3] == b'ID3' or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return None
+
+def _finish(y, native_rate, sr):
+    """Downmix and resample exactly as librosa.load does."""
+    import librosa
+    y = librosa.to_mono(y)
+    if sr is not None:
+        y = librosa.resample(y, orig_sr=native_rate, target_sr=sr, res_type='soxr_hq')
+    else:
+        sr = native_rate
+    return y, sr
+
+def _decode_soundfile(data):
+    """Decode WAV/FLAC/Ogg bytes with libsndfile; returns (channels-first float32, native rate)."""
+    import soundfile as sf
+    with sf.SoundFile(io.BytesIO(data)) as sf_desc:
+        native_rate = sf_desc.samplerate
+        y = sf_desc.read(dtype='float32', always_2d=False).T
+    return y, native_rate
+
+def _decode_av(data):
+    """
+    Decode any FFmpeg-supported container (webm/Opus in particular) in-process.
+
+    Samples are converted to interleaved int16 at the native rate, which is
+    what the audioread fallback gets from the ffmpeg CLI, so both paths
+    produce the same signal.
+    """
+    import av
+    chunks = []
+    with av.open(io.BytesIO(data), mode='r') as container:
+        stream = container.streams.audio[0]
+        resampler = None
+        for frame in container.decode(stream):
+            if resampler is None:
+                channels = len(frame.layout.channels)
+                native_rate = frame.sample_rate
+                resampler = av.AudioResampler(format='s16', layout=frame.layout.name, rate=native_rate)
+            for converted in resampler.resample(frame):
+                chunks.append(converted.to_ndarray().reshape(-1))
+        if resampler is None:
+            raise ValueError("No audio frames in stream")
+        for converted in resampler.resample(None):
+            chunks.append(converted.to_ndarray().reshape(-1))
+
+    pcm = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+    y = (pcm.reshape(-1, channels).T / 32768.0).astype(np.float32)
+    if channels == 1:
+        y = y[0]
+    return y, native_rate
+
+def _decode_subprocess(data, container):
+    """Last resort: let librosa/audioread decode a temporary copy (spawns ffmpeg)."""
+    import librosa
+    suffix = f".{container}" if container else ''
+    fd, temp_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return librosa.load(temp_path, sr=None, mono=False)
+    finally:
+        os.remove(temp_path)
+
+def decode_bytes(data, sr):
+    """
+    Decode an in-memory recording to mono float32 PCM.
+
+    :param data: the encoded file contents
+    :param sr: target sample rate (None keeps the native rate)
+    :return: (samples, rate)
+    """
+    container = sniff_container(data[:SNIFF_BYTES])
+
+    if container in SOUNDFILE_CONTAINERS:
+        try:
+            return _finish(*_decode_soundfile(data), sr)
+        except Exception as e:
+            # e.g. Ogg/Opus with a libsndfile older than 1.0.29
+            logger.debug(f"soundfile could not decode {container} data: {e}")
+
+    if container is not None:
+        try:
+            return _finish(*_decode_av(data), sr)
+        except ImportError:
+            logger.debug(f"PyAV is not installed; in-process decoding of {container} is unavailable")
+        except Exception as e:
+            logger.debug(f"PyAV could not decode {container} data: {e}")
+
+    logger.warning(f"Falling back to subprocess decoding for {container or 'unrecognised'} audio")
+    return _finish(*_decode_subprocess(data, container), sr)
+
+def decode_stream(stream, sr):
+    """Decode a readable binary stream (e.g. an upload's FileStorage.stream) without touching disk."""
+    return decode_bytes(stream.read(), sr)
+
+def decode_file(file_path, sr):
+    """Decode a file on disk, choosing the decoder from its contents rather than its extension."""
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    return decode_bytes(data, sr)
@@ -1,70 +1,146 @@
 import numpy as np
 import logging
-from sklearn.feature_selection import VarianceThreshold
-from sklearn.preprocessing import RobustScaler
-import python_speech_features as mfcc
 import os
+from voiceauth.frontend import get_frontend
+from voiceauth.cmvn import online_cmvn, load_global_stats
+from voiceauth.logging_setup import configure_logging, DebugSampler
 
 # Configure logging
-logging.basicConfig(filename='process.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging()
+logger = logging.getLogger(__name__)
+# The per-coefficient variances are only logged for a sample of utterances
+_log_variances = DebugSampler(logger)
 
-def calculate_delta(features):
+# Floating point type of the feature pipeline ('float64' or 'float32')
+FEATURE_DTYPE = np.dtype(os.environ.get('FEATURE_DTYPE', 'float64'))
+
+# Normalization of the MFCCs: 'robust' fits a VarianceThreshold and a
+# RobustScaler on every utterance (the original pipeline, whose dimensionality
+# can vary), 'cmvn' applies sliding-window CMVN and 'cmvn_global' seeds it
+# with statistics of the UBM corpus. Speaker models record the mode they were
+# enrolled with, and the UBM must be trained with the same one.
+FEATURE_NORMALIZATION = os.environ.get('FEATURE_NORMALIZATION', 'robust').lower()
+NORMALIZATION_MODES = ('robust', 'cmvn', 'cmvn_global')
+
+def model_normalization(stats):
+    """Normalization a speaker model was enrolled with; models without the field predate CMVN."""
+    if not stats:
+        return 'robust'
+    return stats.get('normalization', 'robust')
+
+def calculate_delta(features, N=1):
     """
     Calculate the delta MFCC of the input array.
+
+    Uses the standard regression formula
+    d_t = sum_{n=1..N} n * (c_{t+n} - c_{t-n}) / (2 * sum_{n=1..N} n^2),
+    vectorized over all frames. The first and last N frames, which lack a
+    full window, keep the input values as in the original implementation.
     :param features: 2D array of MFCC features
+    :param N: regression window half-width in frames
     :return: 2D array of delta features
     """
-    rows, cols = features.shape
-    deltas = np.zeros((rows, cols))
-    
-    for i in range(rows):
-        if i == 0:
-            deltas[i] = features[i]
-        elif i == rows - 1:
-            deltas[i] = features[i]
-        else:
-            deltas[i] = (features[i + 1] - features[i - 1]) / 2
-            
+    features = np.asarray(features)
+    rows = features.shape[0]
+    deltas = features.copy()
+
+    if rows > 2 * N:
+        weights = np.arange(-N, N + 1, dtype=features.dtype)
+        denominator = 2 * np.sum(weights[N + 1:] ** 2)
+        windows = np.lib.stride_tricks.sliding_window_view(features, 2 * N + 1, axis=0)
+        deltas[N:rows - N] = (windows @ weights) / denominator
+
     return deltas
 
-def extract_features(audio, rate):
+def robust_scale(mfcc_feat):
+    """
+    Drops low-variance coefficients and scales the rest with a RobustScaler
+    fitted on the utterance itself.
+    :param mfcc_feat: (NUMFRAMES, numcep) MFCC array of one utterance
+    :return: scaled MFCCs, possibly with fewer columns
+    """
+    # sklearn is imported on first use rather than with the module
+    from sklearn.feature_selection import VarianceThreshold
+    from sklearn.preprocessing import RobustScaler
+
+    # Check feature variance before scaling
+    feature_variances = np.var(mfcc_feat, axis=0)
+    if _log_variances():
+        logger.debug("Feature Variance: %s", feature_variances)
+
+    # Filter low variance features only if there are significant variances
+    if np.all(feature_variances < 1e-4):
+        logger.warning("All features have low variance; skipping filtering.")
+    else:
+        selector = VarianceThreshold(threshold=1e-5)  # Adjusted threshold to retain more features
+        mfcc_feat = selector.fit_transform(mfcc_feat)
+
+    # Scale the MFCC features using RobustScaler
+    scaler = RobustScaler()
+    return scaler.fit_transform(mfcc_feat)
+
+def normalize_mfcc(mfcc_feat, normalization=None):
+    """
+    Normalizes the MFCCs of one utterance.
+    :param mfcc_feat: (NUMFRAMES, numcep) MFCC array
+    :param normalization: one of NORMALIZATION_MODES (default: FEATURE_NORMALIZATION)
+    :return: normalized MFCCs
+    """
+    normalization = FEATURE_NORMALIZATION if normalization is None else normalization
+    if normalization == 'robust':
+        return robust_scale(mfcc_feat)
+    if normalization == 'cmvn':
+        return online_cmvn(mfcc_feat)
+    if normalization == 'cmvn_global':
+        return online_cmvn(mfcc_feat, global_stats=load_global_stats())
+    raise ValueError(f"Unknown feature normalization '{normalization}'; expected one of {NORMALIZATION_MODES}")
+
+def mfcc_to_features(mfcc_feat, delta_order=1, delta_width=1, normalization=None):
+    """
+    Turns raw MFCCs into the feature vectors the GMMs are trained and scored on:
+    the MFCCs are normalized and deltas are appended.
+    :param mfcc_feat: (NUMFRAMES, numcep) MFCC array of one utterance
+    :param delta_order: 1 appends deltas, 2 also appends delta-deltas
+    :param delta_width: regression window half-width N for the deltas
+    :param normalization: one of NORMALIZATION_MODES (default: FEATURE_NORMALIZATION)
+    :return: Combined feature vector of MFCCs and their deltas
+    """
+    mfcc_feat = normalize_mfcc(mfcc_feat, normalization)
+
+    # Calculate delta (and optionally delta-delta) features
+    feature_blocks = [mfcc_feat]
+    for _ in range(delta_order):
+        feature_blocks.append(calculate_delta(feature_blocks[-1], N=delta_width))
+
+    # Combine MFCC and delta features
+    combined_features = np.hstack(feature_blocks)
+
+    return combined_features
+
+def extract_features(audio, rate, delta_order=1, delta_width=1, dtype=None, normalization=None):
     """
     Extracts MFCC vectors from the audio file and combines them with delta MFCCs,
     creating a feature vector.
     :param audio: Input audio signal
     :param rate: Sampling rate of the audio file
+    :param delta_order: 1 appends deltas, 2 also appends delta-deltas
+    :param delta_width: regression window half-width N for the deltas
+    :param dtype: floating point type of the features (default: FEATURE_DTYPE)
+    :param normalization: one of NORMALIZATION_MODES (default: FEATURE_NORMALIZATION)
     :return: Combined feature vector of MFCCs and their deltas
     """
+    dtype = FEATURE_DTYPE if dtype is None else np.dtype(dtype)
     try:
-        # Extract MFCC features with defined parameters
-        mfcc_feat = mfcc.mfcc(audio, rate, winlen=0.025, winstep=0.01, numcep=20, appendEnergy=True, nfft=2048)
+        # Extract MFCC features with the cached front-end for this rate
+        # (winlen=0.025, winstep=0.01, numcep=20, appendEnergy=True, nfft=2048 at 44.1 kHz)
+        mfcc_feat = get_frontend(rate, dtype=dtype).mfcc(audio)
         
         # Log the shape of extracted MFCC features
-        logging.info(f"Extracted MFCC features shape: {mfcc_feat.shape}")
-
-        # Check feature variance before scaling
-        feature_variances = np.var(mfcc_feat, axis=0)
-        logging.info("Feature Variance: {}".format(feature_variances))
-
-        # Filter low variance features only if there are significant variances
-        if np.all(feature_variances < 1e-4):
-            logging.warning("All features have low variance; skipping filtering.")
-        else:
-            selector = VarianceThreshold(threshold=1e-5)  # Adjusted threshold to retain more features
-            mfcc_feat = selector.fit_transform(mfcc_feat)
-
-        # Scale the MFCC features using RobustScaler
-        scaler = RobustScaler()
-        mfcc_feat = scaler.fit_transform(mfcc_feat)
-        
-        # Calculate delta features
-        delta_feat = calculate_delta(mfcc_feat)
-        
-        # Combine MFCC and delta features
-        combined_features = np.hstack((mfcc_feat, delta_feat))
-        
-        return combined_features
+        logger.debug("Extracted MFCC features shape: %s", mfcc_feat.shape)
+
+        return mfcc_to_features(mfcc_feat, delta_order=delta_order, delta_width=delta_width,
+                                normalization=normalization)
     
     except Exception as e:
-        logging.error(f"Error extracting features: {e}")
+        logger.error("Error extracting features: %s", e)
         return None
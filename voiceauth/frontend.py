@@ -0,0 +1,123 @@
+import threading
+import numpy as np
+import scipy.fft
+import scipy.signal
+from python_speech_features.base import get_filterbanks
+from python_speech_features.sigproc import round_half_up
+
+class FeatureFrontend:
+    """
+    DSP front-end configured once per sample rate.
+
+    Everything that depends only on the configuration - frame geometry, mel
+    filterbank, liftered DCT matrix and the low-pass IIR coefficients used by
+    the deepfake histogram - is computed in the constructor. MFCCs are then a
+    single batched rFFT over zero-copy frame views followed by two matrix
+    products, producing the same values as python_speech_features.mfcc.
+    """
+
+    def __init__(self, rate, winlen=0.025, winstep=0.01, numcep=20, nfilt=26, nfft=None,
+                 lowfreq=0, highfreq=None, preemph=0.97, ceplifter=22, append_energy=True,
+                 cutoff_frequency=4000, filter_order=4, dtype=np.float64):
+        self.rate = rate
+        self.numcep = numcep
+        self.preemph = preemph
+        self.append_energy = append_energy
+        self.cutoff_frequency = cutoff_frequency
+        self.dtype = np.dtype(dtype)
+
+        self.frame_len = int(round_half_up(winlen * rate))
+        self.frame_step = int(round_half_up(winstep * rate))
+
+        # Smallest power of two holding a frame: 2048 at 44.1 kHz, 512 at 16 kHz
+        if nfft is None:
+            nfft = 1 << (self.frame_len - 1).bit_length()
+        self.nfft = nfft
+
+        # (nfft // 2 + 1, nfilt) so that power spectra map to filterbank energies with one GEMM
+        self.filterbank = get_filterbanks(nfilt, nfft, rate, lowfreq, highfreq).T.astype(self.dtype)
+
+        # Orthonormal DCT-II basis restricted to numcep outputs, with the lifter folded in
+        dct_matrix = scipy.fft.dct(np.eye(nfilt), type=2, norm='ortho', axis=1)[:, :numcep]
+        if ceplifter > 0:
+            n = np.arange(numcep)
+            dct_matrix = dct_matrix * (1 + (ceplifter / 2.) * np.sin(np.pi * n / ceplifter))
+        self.dct_matrix = dct_matrix.astype(self.dtype)
+
+        # Low-pass filter applied before the deepfake histogram
+        nyquist_frequency = rate / 2
+        self.lowpass_b, self.lowpass_a = scipy.signal.butter(
+            filter_order, float(cutoff_frequency) / nyquist_frequency, btype='low')
+
+    def frames(self, signal):
+        """Split a (pre-emphasized) signal into zero-padded frames, as a strided view."""
+        slen = len(signal)
+        if slen <= self.frame_len:
+            numframes = 1
+        else:
+            numframes = 1 + int(np.ceil((slen - self.frame_len) / self.frame_step))
+        padlen = (numframes - 1) * self.frame_step + self.frame_len
+
+        padded = np.zeros(padlen, dtype=self.dtype)
+        padded[:slen] = signal
+        return np.lib.stride_tricks.sliding_window_view(padded, self.frame_len)[::self.frame_step]
+
+    def mfcc(self, signal):
+        """
+        Compute MFCCs for a whole utterance.
+
+        :param signal: 1D audio signal (int16 PCM or float)
+        :return: (NUMFRAMES, numcep) array of the front-end dtype
+        """
+        signal = np.asarray(signal, dtype=self.dtype)
+        return self.cepstra(self.frames(self.preemphasis(signal)))
+
+    def preemphasis(self, signal, previous=None):
+        """
+        Apply the pre-emphasis filter y[n] = x[n] - preemph * x[n-1].
+
+        :param signal: 1D signal of the front-end dtype
+        :param previous: the sample preceding `signal` when it continues a
+                         stream; None at the start of an utterance, where the
+                         first sample passes through unchanged
+        """
+        emphasized = np.empty_like(signal)
+        if len(signal):
+            emphasized[0] = signal[0] if previous is None else signal[0] - self.preemph * previous
+        np.subtract(signal[1:], self.preemph * signal[:-1], out=emphasized[1:])
+        return emphasized
+
+    def cepstra(self, frames):
+        """MFCCs of (NUMFRAMES, frame_len) pre-emphasized frames."""
+        spectrum = scipy.fft.rfft(frames, n=self.nfft, axis=1)
+        pspec = (np.square(spectrum.real) + np.square(spectrum.imag)) / self.nfft
+
+        eps = np.finfo(float).eps
+        energy = pspec.sum(axis=1)
+        energy[energy == 0] = eps
+
+        feat = pspec @ self.filterbank
+        feat[feat == 0] = eps
+        cepstra = np.log(feat) @ self.dct_matrix
+        if self.append_energy:
+            cepstra[:, 0] = np.log(energy)
+        return cepstra
+
+    def lowpass(self, audio_data):
+        """Zero-phase low-pass filter of the signal, as DataProcessing.filter_audio does."""
+        return scipy.signal.filtfilt(self.lowpass_b, self.lowpass_a, audio_data)
+
+_frontends = {}
+_frontends_lock = threading.Lock()
+
+def get_frontend(rate, **kwargs):
+    """Return the shared FeatureFrontend for a sample rate and configuration."""
+    key = (rate, tuple(sorted((name, str(value)) for name, value in kwargs.items())))
+    frontend = _frontends.get(key)
+    if frontend is None:
+        with _frontends_lock:
+            frontend = _frontends.get(key)
+            if frontend is None:
+                frontend = FeatureFrontend(rate, **kwargs)
+                _frontends[key] = frontend
+    return frontend
@@ -1,38 +1,46 @@
 import numpy as np  # Corrected import statement
 import logging
-from sklearn.mixture import GaussianMixture
 import joblib
 from scipy.io import wavfile
-from voiceauth.feature_extraction import extract_features
+from voiceauth.feature_extraction import extract_features, FEATURE_NORMALIZATION
+from voiceauth.audio import DecodedAudio, DEFAULT_SAMPLE_RATE, LEGACY_SAMPLE_RATE
+from voiceauth.map_adaptation import map_adapt
+from voiceauth.scoring import to_compact
+from voiceauth.vad import VAD_ENABLED, trim_silence
+from voiceauth import worker_pool
+from voiceauth.logging_setup import configure_logging
 from tqdm import tqdm
 import time
-from multiprocessing import Pool
+import threading
 import os
 
 # Configure logging
-logging.basicConfig(filename='gmm_training.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging()
+logger = logging.getLogger(__name__)
 
 def process_file(file_path):
     """Process a single WAV file and extract features."""
     try:
-        # Use librosa to load audio (handles various formats including webm)
-        import librosa
-        audio, rate = librosa.load(file_path, sr=44100)
+        # Decode with librosa (handles various formats including webm)
+        decoded = DecodedAudio.from_file(file_path, sr=DEFAULT_SAMPLE_RATE)
+        if VAD_ENABLED:
+            decoded, vad_stats = trim_silence(decoded)
+            logger.debug("VAD kept %.0f%% of %s", 100 * vad_stats['kept_fraction'], os.path.basename(file_path))
         
-        # Convert to int16 to match original wavfile.read behavior for feature extraction
-        audio = (audio * 32768).astype(np.int16)
+        # int16 PCM to match original wavfile.read behavior for feature extraction
+        audio, rate = decoded.pcm16, decoded.rate
         
-        logging.info(f"Successfully read file: {os.path.basename(file_path)} with sample rate: {rate}")
+        logger.debug("Successfully read file: %s with sample rate: %s", os.path.basename(file_path), rate)
         
         features = extract_features(audio, rate)
         
         if features is not None:
-            logging.info(f"Features extracted from {os.path.basename(file_path)}: shape {features.shape}")
+            logger.debug("Features extracted from %s: shape %s", os.path.basename(file_path), features.shape)
         
         return features
     
     except Exception as e:
-        logging.error(f"Error reading file {file_path}: {e}")
+        logger.error("Error reading file %s: %s", file_path, e)
         return None
 
 def load_features_from_directory(directory):
@@ -41,32 +49,95 @@ def load_features_from_directory(directory):
     
     # List all WAV files in the directory
     wav_files = [f for f in os.listdir(directory) if f.endswith('.wav')]
-    logging.info(f"Found {len(wav_files)} WAV files in '{directory}'.")
+    logger.info("Found %d WAV files in '%s'.", len(wav_files), directory)
 
-    # Use multiprocessing to extract features in parallel
-    with Pool() as pool:
-        results = list(tqdm(pool.imap(process_file, [os.path.join(directory, f) for f in wav_files]), total=len(wav_files)))
+    # Extract features in parallel on the shared worker pool
+    results = list(tqdm(worker_pool.imap(process_file, [os.path.join(directory, f) for f in wav_files]), total=len(wav_files)))
 
     # Filter out None results and concatenate features
     features_list = [result for result in results if result is not None]
     
     if features_list:
         all_features = np.vstack(features_list)  # Concatenate the features into a single array
-        logging.info(f"Total features concatenated: {all_features.shape}")
+        logger.info("Total features concatenated: %s", all_features.shape)
         return all_features
     else:
-        logging.warning("No features were loaded. Please check your audio files.")
+        logger.warning("No features were loaded. Please check your audio files.")
         return np.array([])
 
-def train_gmm(features, ubm_model_path, n_components):
-    """Train a GMM using UBM as baseline."""
+# Enrollment strategies accepted by train_gmm
+ENROLLMENT_STRATEGIES = ('em', 'map')
+
+_ubm_cache = {}
+_compact_ubm_cache = {}
+_ubm_cache_lock = threading.Lock()
+
+def load_ubm(ubm_model_path):
+    """Load the UBM once per process; reload only when the file on disk changes."""
+    st = os.stat(ubm_model_path)
+    signature = (st.st_mtime_ns, st.st_size)
+    with _ubm_cache_lock:
+        cached = _ubm_cache.get(ubm_model_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        ubm_model = joblib.load(ubm_model_path)
+        _ubm_cache[ubm_model_path] = (signature, ubm_model)
+        logger.info("Loaded UBM from %s", ubm_model_path)
+        ubm_rate = getattr(ubm_model, 'sample_rate_', LEGACY_SAMPLE_RATE)
+        if ubm_rate != DEFAULT_SAMPLE_RATE:
+            logger.warning("UBM was trained at %s Hz but the pipeline runs at %s Hz; retrain it with voiceauth.UBM",
+                           ubm_rate, DEFAULT_SAMPLE_RATE)
+        ubm_normalization = getattr(ubm_model, 'feature_normalization_', 'robust')
+        if ubm_normalization != FEATURE_NORMALIZATION:
+            logger.warning("UBM was trained on '%s' features but FEATURE_NORMALIZATION is '%s'; retrain it with voiceauth.UBM",
+                           ubm_normalization, FEATURE_NORMALIZATION)
+        return ubm_model
+
+def load_compact_ubm(ubm_model_path):
+    """The cached UBM converted for fast scoring; converted again only when the UBM is reloaded."""
+    ubm_model = load_ubm(ubm_model_path)
+    with _ubm_cache_lock:
+        cached = _compact_ubm_cache.get(ubm_model_path)
+        if cached is not None and cached[0] is ubm_model:
+            return cached[1]
+        compact = to_compact(ubm_model)
+        _compact_ubm_cache[ubm_model_path] = (ubm_model, compact)
+        return compact
+
+def adapt_gmm(features, ubm_model_path, relevance_factor=16, adapt_weights=False, adapt_variances=False):
+    """Enroll a speaker by relevance-MAP adaptation of the cached UBM."""
+    ubm_model = load_ubm(ubm_model_path)
+    
+    start_time = time.time()
+    
+    gmm_model = map_adapt(ubm_model, features, relevance_factor=relevance_factor,
+                          adapt_weights=adapt_weights, adapt_variances=adapt_variances)
+    
+    elapsed_time = time.time() - start_time
+    logger.info("GMM model adapted from UBM in %.3f seconds.", elapsed_time)
+    
+    return gmm_model
+
+def train_gmm(features, ubm_model_path, n_components, strategy='em', relevance_factor=16):
+    """
+    Train a speaker GMM using the UBM as baseline.
+
+    strategy='em' refits a GMM with EM, initialized from the UBM parameters.
+    strategy='map' adapts the UBM means with relevance-MAP instead; the
+    number of components is then that of the UBM.
+    """
+    if strategy not in ENROLLMENT_STRATEGIES:
+        raise ValueError(f"Unknown enrollment strategy '{strategy}'. Must be one of: {', '.join(ENROLLMENT_STRATEGIES)}")
+    
+    if strategy == 'map':
+        return adapt_gmm(features, ubm_model_path, relevance_factor=relevance_factor)
     
     # Load UBM model parameters
-    ubm_model = joblib.load(ubm_model_path)
+    ubm_model = load_ubm(ubm_model_path)
     
     # Check shapes of UBM parameters
-    logging.info("UBM Means shape: {}".format(ubm_model.means_.shape))
-    logging.info("UBM Covariances shape: {}".format(ubm_model.covariances_.shape))
+    logger.info("UBM Means shape: %s", ubm_model.means_.shape)
+    logger.info("UBM Covariances shape: %s", ubm_model.covariances_.shape)
 
     # Ensure that covariances_ is a 3D array where each covariance matrix is diagonal
     covariances = ubm_model.covariances_
@@ -82,7 +153,8 @@ def train_gmm(features, ubm_model_path, n_components):
     # Here we need to use the diagonal elements and invert them
     precisions_init = np.array([1.0 / regularized_covariances[i, :, i] for i in range(n_components)])
 
-    # Initialize GMM with UBM parameters
+    # Initialize GMM with UBM parameters (sklearn is only imported once a model is trained)
+    from sklearn.mixture import GaussianMixture
     gmm_model = GaussianMixture(
         n_components=n_components,
         means_init=ubm_model.means_,
@@ -91,21 +163,25 @@ def train_gmm(features, ubm_model_path, n_components):
         max_iter=200
     )
     
-    logging.info("Fitting the GMM model to the extracted features...")
+    logger.info("Fitting the GMM model to the extracted features...")
     
     start_time = time.time()
     
     gmm_model.fit(features)
     
     elapsed_time = time.time() - start_time
-    logging.info(f"GMM model training completed successfully in {elapsed_time:.2f} seconds.")
+    logger.info("GMM model training completed successfully in %.2f seconds.", elapsed_time)
     
     return gmm_model
 
 def save_gmm_model(gmm_model, model_path):
     """Save the trained GMM model."""
     try:
-        joblib.dump(gmm_model, model_path)
-        logging.info(f"GMM model trained and saved successfully at {model_path}.")
+        # Write then rename, so readers in other workers never see a partial
+        # pickle and the directory mtime reflects the update
+        temp_path = f"{model_path}.tmp"
+        joblib.dump(gmm_model, temp_path)
+        os.replace(temp_path, model_path)
+        logger.info("GMM model trained and saved successfully at %s.", model_path)
     except Exception as e:
-        logging.error(f"Error saving GMM model: {e}")
+        logger.error("Error saving GMM model: %s", e)
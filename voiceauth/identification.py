@@ -0,0 +1,238 @@
+"""
+1:N speaker identification.
+
+A speaker model MAP-adapted from the UBM (ENROLLMENT_MODE=map) keeps the
+UBM's components in the same order. Aligning an utterance's frames with the
+UBM once gives zeroth-, first- and second-order statistics, and under that
+fixed alignment each such speaker's log-likelihood is a dot product between
+those statistics and the speaker's folded scoring constants
+(CompactGMM.constants and CompactGMM.projection). Stacking one such row per
+speaker turns scoring an utterance against every MAP speaker into a single
+matrix-vector product.
+
+Models refit with EM (ENROLLMENT_MODE=em, the default) are merely seeded
+from the UBM: their components no longer correspond to the UBM's, and the
+fixed-alignment score of such a model is meaningless. They are scored
+exactly instead, one model at a time (exact_candidates).
+"""
+import os
+import logging
+import threading
+import numpy as np
+from voiceauth.scoring import load_compact_model, logsumexp_rows
+
+logger = logging.getLogger(__name__)
+
+def alignment_statistics(ubm, X):
+    """
+    Baum-Welch statistics of an utterance under the UBM posteriors.
+
+    :param ubm: CompactGMM of the universal background model
+    :param X: (N, D) feature matrix
+    :return: (K * (2D + 1),) vector [N_k, (F_k, S_k) per component] in the
+             UBM dtype, where F_k and S_k are the posterior-weighted sums of
+             x and x^2
+    """
+    expanded = ubm.expand(X)
+    log_prob = ubm.component_log_prob(X, expanded=expanded)
+    log_prob -= logsumexp_rows(log_prob.copy())[:, np.newaxis]
+    posteriors = np.exp(log_prob, out=log_prob)
+    zeroth = posteriors.sum(axis=0)
+    higher = posteriors.T @ expanded
+    return np.concatenate([zeroth, higher.ravel()])
+
+def rank_speakers(scores, usernames, baseline, n_frames, top_k):
+    """
+    Turn raw fixed-alignment scores into the top-k candidates.
+
+    :param scores: (S,) dot products of each speaker row with the statistics
+    :param usernames: sequence of S usernames, aligned with `scores`
+    :param baseline: the UBM row's dot product with the same statistics
+    :param n_frames: number of frames the statistics were collected over
+    :param top_k: number of candidates to return
+    :return: list of {"username", "llr"} dicts, best first
+    """
+    count = len(scores)
+    if count == 0 or top_k < 1:
+        return []
+    k = min(top_k, count)
+    best = np.argpartition(scores, count - k)[count - k:]
+    best = best[np.argsort(scores[best])[::-1]]
+    return [{
+        "username": usernames[i],
+        "llr": (float(scores[i]) - baseline) / n_frames
+    } for i in best]
+
+def partition_speakers(speaker_stats):
+    """
+    Split speakers by how they can be identified.
+
+    :param speaker_stats: dict of username -> model_stats.json contents (None
+                          if missing); models without an enrollment_mode
+                          predate MAP enrollment and were refit with EM
+    :return: (aligned, exact): sets of the MAP speakers, scored under the UBM
+             alignment, and of the other speakers, scored exactly
+    """
+    aligned, exact = set(), set()
+    for username, stats in speaker_stats.items():
+        if (stats or {}).get('enrollment_mode', 'em') == 'map':
+            aligned.add(username)
+        else:
+            exact.add(username)
+    return aligned, exact
+
+def exact_candidates(ubm, X, models, top_k):
+    """
+    Rank speakers by their exact average per-frame log-likelihood ratio
+    against the UBM, for models that do not share the UBM's components.
+
+    :param ubm: CompactGMM of the universal background model
+    :param X: (N, D) feature matrix
+    :param models: dict of username -> CompactGMM with D features
+    :param top_k: number of candidates to return
+    :return: list of {"username", "llr"} dicts, best first
+    """
+    if not models or len(X) == 0:
+        return []
+    expanded = ubm.expand(X)
+    baseline = logsumexp_rows(ubm.component_log_prob(X, expanded=expanded))
+    usernames = list(models)
+    scores = np.array([np.mean(logsumexp_rows(models[u].component_log_prob(X, expanded=expanded)) - baseline,
+                               dtype=np.float64) for u in usernames])
+    return rank_speakers(scores, usernames, 0.0, 1, top_k)
+
+class SpeakerIndex:
+    """
+    In-memory stack of the scoring rows of speakers kept as `.gmm` pickles.
+    Only rows of MAP-adapted models give meaningful scores (see the module
+    docstring); identify() is told which speakers those are.
+
+    The packed ModelStore scores its own rows; this index covers the
+    speakers outside it (pickles from before the store, and enrollments
+    whose shape did not fit the store's layout). Rows are kept dense:
+    removing a speaker moves the last row into its slot. Identification
+    scores the utterance against every row with one GEMV and ranks speakers
+    by their average per-frame log-likelihood ratio against the UBM.
+    """
+
+    def __init__(self, ubm, capacity=1024):
+        self.ubm = ubm
+        self.ubm_row = ubm.to_row()[:ubm.n_components * (2 * ubm.n_features + 1)]
+        self.row_size = len(self.ubm_row)
+        self._matrix = np.empty((capacity, self.row_size), dtype=ubm.dtype)
+        self._usernames = []
+        self._rows = {}
+        self._signatures = {}
+        # Speakers whose pickle could not be indexed (e.g. another layout than the UBM), with the reason
+        self.skipped = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, model_dir, ubm):
+        """Build an index from every `<username>.gmm` in model_dir that matches the UBM layout."""
+        index = cls(ubm, capacity=max(len(os.listdir(model_dir)), 1))
+        index.sync_directory(model_dir)
+        return index
+
+    def sync_directory(self, model_dir):
+        """
+        Bring the index in line with the `.gmm` files in model_dir.
+
+        Only files whose (mtime, size) changed since the last sync are
+        loaded; speakers whose file disappeared are removed.
+        Returns the number of speakers added, replaced or removed.
+        """
+        seen = {}
+        with os.scandir(model_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.gmm') and entry.is_file():
+                    st = entry.stat()
+                    seen[entry.name[:-len('.gmm')]] = (entry.path, (st.st_mtime_ns, st.st_size))
+
+        changes = 0
+        for username in [u for u in self._signatures if u not in seen]:
+            self.remove(username)
+            self.skipped.pop(username, None)
+            changes += 1
+        for username, (path, signature) in seen.items():
+            if self._signatures.get(username) == signature:
+                continue
+            try:
+                self.add(username, load_compact_model(path))
+                self.skipped.pop(username, None)
+            except Exception as e:
+                logger.warning(f"Skipping {username} in the identification index: {e}")
+                self.remove(username)
+                self.skipped[username] = str(e)
+            self._signatures[username] = signature
+            changes += 1
+        if changes:
+            logger.info(f"Identification index synced: {changes} change(s), {len(self)} speakers")
+        return changes
+
+    def __len__(self):
+        return len(self._usernames)
+
+    def __contains__(self, username):
+        return username in self._rows
+
+    def usernames(self):
+        """Usernames of all indexed speakers."""
+        with self._lock:
+            return list(self._usernames)
+
+    def add(self, username, model):
+        """Insert or replace a speaker; the model must have the UBM's shape."""
+        if (model.n_components, model.n_features) != (self.ubm.n_components, self.ubm.n_features):
+            raise ValueError(
+                f"Model shape {model.n_components}x{model.n_features} does not match the UBM "
+                f"({self.ubm.n_components}x{self.ubm.n_features})")
+        row = model.to_row()[:self.row_size]
+        with self._lock:
+            position = self._rows.get(username)
+            if position is None:
+                position = len(self._usernames)
+                if position == len(self._matrix):
+                    grown = np.empty((max(2 * len(self._matrix), 1), self.row_size), dtype=self._matrix.dtype)
+                    grown[:position] = self._matrix[:position]
+                    self._matrix = grown
+                self._usernames.append(username)
+                self._rows[username] = position
+            self._matrix[position] = row
+
+    def remove(self, username):
+        """Drop a speaker, if present."""
+        with self._lock:
+            self._signatures.pop(username, None)
+            position = self._rows.pop(username, None)
+            if position is None:
+                return
+            last = len(self._usernames) - 1
+            if position != last:
+                moved = self._usernames[last]
+                self._matrix[position] = self._matrix[last]
+                self._usernames[position] = moved
+                self._rows[moved] = position
+            self._usernames.pop()
+
+    def identify(self, X, top_k=5, usernames=None):
+        """
+        Rank enrolled speakers for an utterance.
+
+        :param X: (N, D) feature matrix
+        :param top_k: number of candidates to return
+        :param usernames: set of the speakers to rank (default: all indexed)
+        :return: list of {"username", "llr"} dicts, best first, where llr is
+                 the average per-frame log-likelihood ratio of the speaker
+                 model against the UBM under the UBM alignment
+        """
+        if len(X) == 0:
+            return []
+        stats = alignment_statistics(self.ubm, X)
+        with self._lock:
+            scores = self._matrix[:len(self._usernames)] @ stats
+            indexed = list(self._usernames)
+        if usernames is not None:
+            selected = [i for i, username in enumerate(indexed) if username in usernames]
+            scores, indexed = scores[selected], [indexed[i] for i in selected]
+        return rank_speakers(scores, indexed, float(self.ubm_row @ stats), len(X), top_k)
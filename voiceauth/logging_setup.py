@@ -0,0 +1,194 @@
+"""
+Logging for feature extraction and model training.
+
+These paths run once per login and, while training the UBM, once per file
+for tens of thousands of files on the worker pool, so their logging is kept
+cheap:
+
+- Loggers use %-style arguments, which are only formatted if the record is
+  emitted, and per-call details are logged at DEBUG.
+- LOG_LEVELS overrides the level of individual modules, e.g.
+  "voiceauth.feature_extraction=DEBUG,voiceauth.gmm=WARNING" (LOG_LEVEL sets
+  the default, INFO).
+- Records are handed to a queue; one listener thread per process formats
+  them and writes LOG_FILE. Pool workers forward their records to the
+  parent's listener instead of appending to the file themselves.
+- DebugSampler lets costly diagnostics through for one call in
+  LOG_SAMPLE_EVERY.
+"""
+import os
+import queue
+import atexit
+import logging
+import itertools
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FILE = os.environ.get('LOG_FILE', 'process.log')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', 100))
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_lock = threading.Lock()
+# This process's queue listener, started on the first record (and again after a fork)
+_local_listener = None
+# Listeners forwarding the records of pool workers, keyed by queue id
+_worker_listeners = {}
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    Hands records to this process's listener thread as they are: the message
+    is only formatted by the listener. Arguments therefore must not be
+    mutated after the logging call.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if _local_listener is None:
+            _start_local_listener(self.queue)
+        self.queue.put_nowait(record)
+
+class _WorkerLogForwarder:
+    """
+    Re-emits records received from pool workers through this process's loggers.
+
+    Unlike QueueListener it is stopped with an event rather than a sentinel:
+    a worker terminated while writing to the queue can leave its write lock
+    held forever.
+    """
+
+    def __init__(self, log_queue):
+        self.queue = log_queue
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._forward, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _forward(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            except (EOFError, OSError):
+                return
+            logging.getLogger(record.name).handle(record)
+
+def _start_local_listener(log_queue):
+    global _local_listener
+    with _lock:
+        if _local_listener is None:
+            handler = logging.FileHandler(LOG_FILE, delay=True)
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            listener = QueueListener(log_queue, handler)
+            listener.start()
+            _local_listener = listener
+
+def parse_levels(spec=LOG_LEVELS):
+    """Parse "module=LEVEL,..." into a dict of logger name to level name."""
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def apply_levels():
+    """Set the root level (LOG_LEVEL) and the per-module overrides (LOG_LEVELS)."""
+    logging.getLogger().setLevel(LOG_LEVEL)
+    for name, level in parse_levels().items():
+        logging.getLogger(name).setLevel(level)
+
+def configure_logging():
+    """
+    Route the root logger through a queue to LOG_FILE. Like
+    logging.basicConfig, this does nothing if the root logger already has
+    handlers, so the first module to call it decides.
+    """
+    root = logging.getLogger()
+    with _lock:
+        if root.handlers:
+            return
+        root.addHandler(_LocalQueueHandler(queue.SimpleQueue()))
+    apply_levels()
+
+def worker_log_queue(ctx):
+    """
+    Queue for the records of pool workers started from `ctx`; a listener in
+    this process re-emits them. Pass it to configure_worker_logging in each
+    worker.
+    """
+    log_queue = ctx.Queue()
+    listener = _WorkerLogForwarder(log_queue)
+    listener.start()
+    with _lock:
+        _worker_listeners[id(log_queue)] = listener
+    return log_queue
+
+def close_worker_log_queue(log_queue):
+    """Stop forwarding records from `log_queue`, after its workers are gone."""
+    with _lock:
+        listener = _worker_listeners.pop(id(log_queue), None)
+    if listener is not None:
+        listener.stop()
+
+def configure_worker_logging(log_queue):
+    """Send every record of this (worker) process to the parent through `log_queue`."""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    apply_levels()
+
+class DebugSampler:
+    """
+    Decides whether a costly debug diagnostic is logged: only when `logger`
+    is enabled for DEBUG, and then for one call in `every`.
+    """
+
+    def __init__(self, logger, every=LOG_SAMPLE_EVERY):
+        self.logger = logger
+        self.every = max(1, every)
+        self._calls = itertools.count()
+
+    def __call__(self):
+        return self.logger.isEnabledFor(logging.DEBUG) and next(self._calls) % self.every == 0
+
+def _stop_listeners():
+    # Drain the queues and join the listener threads: nothing may fork (e.g.
+    # a preloaded gunicorn master) while they hold a lock
+    global _local_listener
+    if _local_listener is not None:
+        _local_listener.stop()
+        _local_listener = None
+    for listener in _worker_listeners.values():
+        listener.stop()
+
+def _restart_worker_listeners():
+    for listener in _worker_listeners.values():
+        listener.start()
+
+def _reset_in_child():
+    global _lock
+    # Another thread may have held the lock at the fork; the pool and its
+    # queue belong to the parent
+    _lock = threading.Lock()
+    _worker_listeners.clear()
+
+os.register_at_fork(before=_stop_listeners, after_in_parent=_restart_worker_listeners,
+                    after_in_child=_reset_in_child)
+atexit.register(_stop_listeners)
@@ -1,41 +1,83 @@
+import copy
 import numpy as np
 
-def map_adapt(gmm, features, max_iterations=10, likelihood_threshold=1e-20, relevance_factor=16):
+def sufficient_statistics(gmm, features):
+    """
+    Zeroth, first and second order Baum-Welch statistics of `features` under `gmm`.
+
+    :param gmm: fitted sklearn GaussianMixture
+    :param features: (N, D) feature matrix
+    :return: tuple (n_k, f_k, s_k) of shapes (K,), (K, D), (K, D)
+    """
+    z_n_k = gmm.predict_proba(features)  # Responsibilities, (N, K)
+    n_k = z_n_k.sum(axis=0)
+    f_k = z_n_k.T @ features
+    s_k = z_n_k.T @ np.square(features)
+    return n_k, f_k, s_k
+
+def map_adapt(gmm, features, max_iterations=1, likelihood_threshold=1e-20, relevance_factor=16,
+              adapt_means=True, adapt_weights=False, adapt_variances=False):
+    """
+    Relevance-MAP adaptation of a UBM to a speaker's features (Reynolds et al., 2000).
+
+    The UBM is left untouched; a deep copy holding the adapted parameters is
+    returned. Statistics are computed with matrix products, so the cost is a
+    couple of (N, K) x (N, D) GEMMs per iteration instead of a Python loop
+    over frames and components. With the default single iteration this is
+    classic UBM-MAP enrollment; further iterations recompute the
+    responsibilities under the adapted model, always using the UBM as prior.
+
+    :param gmm: fitted sklearn GaussianMixture acting as the UBM
+    :param features: (N, D) feature matrix of the target speaker
+    :param max_iterations: maximum number of adaptation passes
+    :param likelihood_threshold: stop once the average log-likelihood changes less than this
+    :param relevance_factor: MAP relevance factor r
+    :param adapt_means: adapt the component means
+    :param adapt_weights: adapt the mixture weights
+    :param adapt_variances: adapt the (diagonal) covariances
+    :return: adapted copy of `gmm`
+    """
+    if adapt_variances and gmm.covariance_type != 'diag':
+        raise ValueError("Variance adaptation is only supported for diagonal covariances")
+
+    features = np.asarray(features, dtype=np.float64)
     N = features.shape[0]
-    D = features.shape[1]
-    K = gmm.n_components  # Use n_components instead of C
+    eps = 10 * np.finfo(features.dtype).eps
 
-    mu_new = np.zeros((K, D))
-    n_k = np.zeros((K, 1))
-    mu_k = gmm.means_  # Access means from sklearn's GaussianMixture
-    cov_k = gmm.covariances_  # Access covariances from sklearn's GaussianMixture
-    pi_k = gmm.weights_  # Access mixing coefficients from sklearn's GaussianMixture
+    ubm_means = gmm.means_
+    ubm_weights = gmm.weights_
+    ubm_covariances = gmm.covariances_
 
-    old_likelihood = gmm.score(features)
-    new_likelihood = 0
-    iterations = 0
+    adapted = copy.deepcopy(gmm)
+    old_likelihood = None
 
-    while (abs(old_likelihood - new_likelihood) > likelihood_threshold and iterations < max_iterations):
-        iterations += 1
-        old_likelihood = new_likelihood
-        
-        z_n_k = gmm.predict_proba(features)  # Get responsibilities
-        n_k = np.sum(z_n_k, axis=0)
+    for _ in range(max_iterations):
+        n_k, f_k, s_k = sufficient_statistics(adapted, features)
+        alpha = n_k / (n_k + relevance_factor)
+        expected_x = f_k / (n_k[:, np.newaxis] + eps)
 
-        for i in range(K):
-            temp = np.zeros((1, D))
-            for n in range(N):
-                temp += z_n_k[n][i] * features[n, :]
-            mu_new[i] = (1 / n_k[i]) * temp if n_k[i] > 0 else mu_k[i]
+        if adapt_means:
+            adapted.means_ = alpha[:, np.newaxis] * expected_x + (1 - alpha[:, np.newaxis]) * ubm_means
 
-        adaptation_coefficient = n_k / (n_k + relevance_factor)
+        if adapt_weights:
+            weights = alpha * n_k / N + (1 - alpha) * ubm_weights
+            adapted.weights_ = weights / weights.sum()
 
-        for k in range(K):
-            mu_k[k] = (adaptation_coefficient[k] * mu_new[k]) + ((1 - adaptation_coefficient[k]) * mu_k[k])
+        if adapt_variances:
+            expected_x2 = s_k / (n_k[:, np.newaxis] + eps)
+            second_moment = (alpha[:, np.newaxis] * expected_x2
+                             + (1 - alpha[:, np.newaxis]) * (ubm_covariances + np.square(ubm_means)))
+            covariances = np.maximum(second_moment - np.square(adapted.means_), gmm.reg_covar)
+            adapted.covariances_ = covariances
+            adapted.precisions_cholesky_ = 1.0 / np.sqrt(covariances)
+            adapted.precisions_ = 1.0 / covariances
 
-        gmm.means_ = mu_k  # Update means in the GMM
+        if max_iterations == 1:
+            break
 
-        log_likelihood = gmm.score(features)  # Calculate new log likelihood
-        new_likelihood = log_likelihood
+        new_likelihood = adapted.score(features)
+        if old_likelihood is not None and abs(new_likelihood - old_likelihood) <= likelihood_threshold:
+            break
+        old_likelihood = new_likelihood
 
-    return gmm
\ No newline at end of file
+    return adapted
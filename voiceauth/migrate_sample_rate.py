@@ -0,0 +1,66 @@
+import os
+import json
+import argparse
+from voiceauth.audio import DEFAULT_SAMPLE_RATE, LEGACY_SAMPLE_RATE
+from voiceauth.model_store import ModelStore
+
+def model_sample_rate(stats):
+    """Sample rate a speaker model was enrolled at; models without the field predate it."""
+    if not stats:
+        return LEGACY_SAMPLE_RATE
+    return int(stats.get('sample_rate', LEGACY_SAMPLE_RATE))
+
+def needs_reenrollment(stats):
+    """True if the model was enrolled at a rate other than the canonical one."""
+    return model_sample_rate(stats) != DEFAULT_SAMPLE_RATE
+
+def enrolled_usernames(model_dir):
+    """Usernames with a model in the packed store (model_dir/store) or a legacy `.gmm` pickle."""
+    usernames = {filename[:-len('.gmm')] for filename in os.listdir(model_dir) if filename.endswith('.gmm')}
+    store_dir = os.path.join(model_dir, 'store')
+    if os.path.isdir(store_dir):
+        usernames.update(ModelStore(store_dir).usernames())
+    return sorted(usernames)
+
+def find_stale_models(model_dir, data_dir):
+    """Yield (username, sample_rate, stats_path) for every speaker model not at the canonical rate."""
+    for username in enrolled_usernames(model_dir):
+        stats_path = os.path.join(data_dir, username, 'model_stats.json')
+        stats = None
+        if os.path.exists(stats_path):
+            with open(stats_path, 'r') as f:
+                stats = json.load(f)
+        if needs_reenrollment(stats):
+            yield username, model_sample_rate(stats), stats_path
+
+def flag_stale_models(model_dir, data_dir):
+    """Mark stale models with 'reenrollment_required' in their stats file. Returns the usernames."""
+    flagged = []
+    for username, rate, stats_path in find_stale_models(model_dir, data_dir):
+        stats = {}
+        if os.path.exists(stats_path):
+            with open(stats_path, 'r') as f:
+                stats = json.load(f)
+        stats.setdefault('sample_rate', rate)
+        stats['reenrollment_required'] = True
+        os.makedirs(os.path.dirname(stats_path), exist_ok=True)
+        with open(stats_path, 'w') as f:
+            json.dump(stats, f)
+        flagged.append(username)
+    return flagged
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="List (and optionally flag) speaker models enrolled at a non-canonical sample rate.")
+    parser.add_argument('--model-dir', default=os.path.join(base_dir, 'voiceauth', 'model'))
+    parser.add_argument('--data-dir', default=os.path.join(base_dir, 'Data'))
+    parser.add_argument('--flag', action='store_true', help="write reenrollment_required into each stale model_stats.json")
+    args = parser.parse_args()
+
+    print(f"Canonical sample rate: {DEFAULT_SAMPLE_RATE} Hz")
+    if args.flag:
+        flagged = flag_stale_models(args.model_dir, args.data_dir)
+        print(f"Flagged {len(flagged)} model(s) for re-enrollment: {', '.join(flagged)}")
+    else:
+        for username, rate, _ in find_stale_models(args.model_dir, args.data_dir):
+            print(f"{username}: enrolled at {rate} Hz")
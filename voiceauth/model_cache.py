@@ -0,0 +1,141 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from voiceauth.scoring import load_compact_model
+
+logger = logging.getLogger(__name__)
+
+# Default memory budget for cached speaker models, in bytes
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+def _file_signature(path):
+    """Return (mtime_ns, size) for a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def read_stats(stats_path, username=None):
+    """Load a speaker's model_stats.json; None if it is missing or unreadable."""
+    try:
+        with open(stats_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Failed to load stats for {username or stats_path}: {e}")
+        return None
+
+def _model_nbytes(model):
+    """Approximate the in-memory size of a fitted model from its numpy attributes."""
+    return sum(value.nbytes for value in vars(model).values() if isinstance(value, np.ndarray))
+
+class _Entry:
+    __slots__ = ('model', 'stats', 'model_signature', 'stats_signature', 'nbytes')
+
+    def __init__(self, model, stats, model_signature, stats_signature, nbytes):
+        self.model = model
+        self.stats = stats
+        self.model_signature = model_signature
+        self.stats_signature = stats_signature
+        self.nbytes = nbytes
+
+class SpeakerModelCache:
+    """
+    Per-process LRU cache of speaker GMMs and their baseline score stats.
+
+    Models are converted to CompactGMM when loaded, so cached entries are
+    ready for scoring without touching sklearn.
+
+    Entries are validated against the mtime and size of the `.gmm` and
+    `model_stats.json` files on every lookup, so a re-enrollment written by
+    any worker is picked up on the next login. The total size of the cached
+    models is kept under `max_bytes` by evicting the least recently used
+    speakers.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, username, model_path, stats_path):
+        """
+        Return (CompactGMM, stats) for a speaker, loading from disk only when needed.
+
+        `stats` is None when the stats file is missing or unreadable.
+        Raises FileNotFoundError if the model file does not exist.
+        """
+        model_signature = _file_signature(model_path)
+        if model_signature is None:
+            self.invalidate(username)
+            raise FileNotFoundError(model_path)
+        stats_signature = _file_signature(stats_path)
+
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                if (entry.model_signature == model_signature
+                        and entry.stats_signature == stats_signature):
+                    self._entries.move_to_end(username)
+                    self.hits += 1
+                    return entry.model, entry.stats
+                self._remove(username)
+                self.invalidations += 1
+            self.misses += 1
+
+        # Load outside the lock so other speakers are not blocked on disk I/O
+        model = load_compact_model(model_path)
+        stats = read_stats(stats_path, username) if stats_signature is not None else None
+        entry = _Entry(model, stats, model_signature, stats_signature, _model_nbytes(model))
+
+        with self._lock:
+            if entry.nbytes <= self.max_bytes:
+                if username in self._entries:
+                    self._remove(username)
+                self._entries[username] = entry
+                self._nbytes += entry.nbytes
+                while self._nbytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._remove(oldest)
+                    self.evictions += 1
+        return model, stats
+
+    def _remove(self, username):
+        entry = self._entries.pop(username)
+        self._nbytes -= entry.nbytes
+
+    def invalidate(self, username):
+        """Drop a speaker from the cache, e.g. after re-enrollment in this worker."""
+        with self._lock:
+            if username in self._entries:
+                self._remove(username)
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop all cached speakers."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        """Counters and occupancy for monitoring."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,323 @@
+"""
+Packed, memory-mapped store of speaker models.
+
+All speakers live in one float32 array file with one row per model, in the
+CompactGMM.to_row layout: the scoring row (per-component constants followed
+by the folded [mu * p, -0.5 p] projection) and then the log-weights. A JSON
+index maps usernames to rows.
+
+Rows are never rewritten in place: enrolling appends a row and re-enrolling
+or deleting a speaker leaves a tombstone behind, so a process that has not
+picked up the new index yet keeps reading a consistent model. The array file
+is opened with np.memmap, so every worker shares the same pages through the
+OS page cache, and 1:N identification runs directly on the mapping.
+compact() rewrites the file without tombstones into a new generation.
+
+The index also records the ENROLLMENT_MODE each row was trained with: only
+rows of MAP-adapted models can be scored under the UBM alignment, so
+identify() skips the others (and rows stored without a mode).
+"""
+import os
+import json
+import logging
+import argparse
+import threading
+import numpy as np
+from voiceauth.scoring import CompactGMM, load_compact_model
+from voiceauth.identification import alignment_statistics, rank_speakers
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STORE_DTYPE = np.dtype(np.float32)
+INDEX_VERSION = 1
+
+def _empty_index():
+    return {
+        "version": INDEX_VERSION,
+        "n_components": None,
+        "n_features": None,
+        "data_file": "speakers-0.f32",
+        "generation": 0,
+        "count": 0,
+        "rows": {},
+        "enrollment_modes": {}
+    }
+
+class _FileLock:
+    """Exclusive inter-process lock on a file (plus an in-process lock)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+class ModelStore:
+    """
+    Speaker models packed into one memory-mapped float32 array.
+
+    Readers reload the index (and re-map the array) only when index.json
+    changed on disk, so lookups cost a stat() and a dict access. Writers
+    serialize on a lock file, append rows, fsync, then atomically replace
+    the index.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.index_path = os.path.join(store_dir, 'index.json')
+        os.makedirs(store_dir, exist_ok=True)
+        self._write_lock = _FileLock(os.path.join(store_dir, 'store.lock'))
+        self._lock = threading.Lock()
+        self._signature = None
+        self._index = _empty_index()
+        self._matrix = None
+        self._live_rows = np.zeros(0, dtype=np.intp)
+        self._live_usernames = []
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return _empty_index()
+
+    def _refresh(self):
+        """Reload the index and re-map the array if another process changed them."""
+        try:
+            st = os.stat(self.index_path)
+            signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            signature = None
+        with self._lock:
+            if signature == self._signature:
+                return
+            index = self._read_index()
+            matrix = None
+            if index['count']:
+                row_size = index['n_components'] * (2 * index['n_features'] + 2)
+                try:
+                    matrix = np.memmap(os.path.join(self.store_dir, index['data_file']), dtype=STORE_DTYPE,
+                                       mode='r', shape=(index['count'], row_size)).view(np.ndarray)
+                except FileNotFoundError:
+                    # Compacted between reading the index and mapping; retry on the next call
+                    return
+            live = sorted(index['rows'].items(), key=lambda item: item[1])
+            self._index = index
+            self._matrix = matrix
+            self._live_rows = np.array([row for _, row in live], dtype=np.intp)
+            self._live_usernames = [username for username, _ in live]
+            self._signature = signature
+
+    def __contains__(self, username):
+        self._refresh()
+        return username in self._index['rows']
+
+    def __len__(self):
+        self._refresh()
+        return len(self._index['rows'])
+
+    def usernames(self):
+        """Usernames of all live speakers, in row order."""
+        self._refresh()
+        return list(self._live_usernames)
+
+    def enrollment_modes(self):
+        """ENROLLMENT_MODE of each live speaker's row; speakers stored without one are missing."""
+        self._refresh()
+        with self._lock:
+            return dict(self._index.get('enrollment_modes', {}))
+
+    def get(self, username):
+        """Return the speaker's CompactGMM as a zero-copy view of the mapping, or None."""
+        self._refresh()
+        with self._lock:
+            row = self._index['rows'].get(username)
+            if row is None:
+                return None
+            return CompactGMM.from_row(self._matrix[row], self._index['n_components'], self._index['n_features'])
+
+    def identify(self, ubm, X, top_k=5, usernames=None):
+        """
+        Rank live MAP-enrolled speakers for an utterance under the UBM
+        alignment; rows of other models are skipped (see identification).
+
+        :param usernames: set of the speakers to rank (default: all MAP speakers)
+        :return: identification.rank_speakers candidates
+        """
+        self._refresh()
+        with self._lock:
+            matrix, rows, live = self._matrix, self._live_rows, self._live_usernames
+            modes = self._index.get('enrollment_modes', {})
+            shape = (self._index['n_components'], self._index['n_features'])
+        if matrix is None or len(X) == 0:
+            return []
+        if shape != (ubm.n_components, ubm.n_features):
+            raise ValueError(f"Store layout {shape[0]}x{shape[1]} does not match the UBM "
+                             f"({ubm.n_components}x{ubm.n_features})")
+        stats = alignment_statistics(ubm, X).astype(STORE_DTYPE)
+        selected = [i for i, username in enumerate(live) if modes.get(username) == 'map'
+                    and (usernames is None or username in usernames)]
+        rows, live = rows[selected], [live[i] for i in selected]
+        # One GEMV over the scoring part of the whole mapping; tombstoned rows are dropped afterwards
+        scores = (matrix[:, :stats.size] @ stats)[rows]
+        baseline = float(ubm.to_row()[:stats.size] @ stats)
+        return rank_speakers(scores, live, baseline, len(X), top_k)
+
+    def stats(self):
+        """Occupancy counters for monitoring."""
+        self._refresh()
+        with self._lock:
+            index = self._index
+            row_bytes = (index['n_components'] or 0) * (2 * (index['n_features'] or 0) + 2) * STORE_DTYPE.itemsize
+            return {
+                "speakers": len(index['rows']),
+                "rows": index['count'],
+                "tombstones": index['count'] - len(index['rows']),
+                "bytes": index['count'] * row_bytes,
+                "generation": index['generation']
+            }
+
+    def _write_index(self, index):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.index_path)
+
+    def put(self, username, model, enrollment_mode=None):
+        """
+        Append a speaker's model, retiring any previous row for that username.
+
+        The first model fixes the store's layout; models of another shape
+        raise ValueError.
+        :param enrollment_mode: ENROLLMENT_MODE the model was trained with
+                                (None if unknown, e.g. an imported pickle)
+        """
+        with self._write_lock:
+            index = self._read_index()
+            if index['n_components'] is None:
+                index['n_components'], index['n_features'] = model.n_components, model.n_features
+            if (model.n_components, model.n_features) != (index['n_components'], index['n_features']):
+                raise ValueError(
+                    f"Model shape {model.n_components}x{model.n_features} does not match the store "
+                    f"layout ({index['n_components']}x{index['n_features']})")
+
+            row = np.ascontiguousarray(model.to_row(), dtype=STORE_DTYPE)
+            data_path = os.path.join(self.store_dir, index['data_file'])
+            with open(data_path, 'ab') as f:
+                # Drop any partial row left by an interrupted writer
+                f.truncate(index['count'] * row.nbytes)
+                f.write(row.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            index['rows'][username] = index['count']
+            index['count'] += 1
+            modes = index.setdefault('enrollment_modes', {})
+            if enrollment_mode is None:
+                modes.pop(username, None)
+            else:
+                modes[username] = enrollment_mode
+            self._write_index(index)
+        logger.info(f"Stored model for {username} at row {index['rows'][username]}")
+
+    def delete(self, username):
+        """Tombstone a speaker's row. Returns False if the speaker was not stored."""
+        with self._write_lock:
+            index = self._read_index()
+            if index['rows'].pop(username, None) is None:
+                return False
+            index.get('enrollment_modes', {}).pop(username, None)
+            self._write_index(index)
+        return True
+
+    def compact(self):
+        """Rewrite the live rows into a new data file and drop the old one. Returns the rows reclaimed."""
+        with self._write_lock:
+            index = self._read_index()
+            reclaimed = index['count'] - len(index['rows'])
+            if reclaimed == 0:
+                return 0
+            row_size = index['n_components'] * (2 * index['n_features'] + 2)
+            old_path = os.path.join(self.store_dir, index['data_file'])
+            old = np.memmap(old_path, dtype=STORE_DTYPE, mode='r', shape=(index['count'], row_size))
+
+            generation = index['generation'] + 1
+            data_file = f"speakers-{generation}.f32"
+            live = sorted(index['rows'].items(), key=lambda item: item[1])
+            with open(os.path.join(self.store_dir, data_file), 'wb') as f:
+                for _, row in live:
+                    f.write(old[row].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            del old
+
+            index.update({
+                "data_file": data_file,
+                "generation": generation,
+                "count": len(live),
+                "rows": {username: position for position, (username, _) in enumerate(live)}
+            })
+            self._write_index(index)
+            # Processes still mapping the old file keep their pages until they re-map
+            try:
+                os.remove(old_path)
+            except OSError as e:
+                logger.warning(f"Could not remove old store file {old_path}: {e}")
+        logger.info(f"Compacted model store: reclaimed {reclaimed} rows")
+        return reclaimed
+
+    def import_pickles(self, model_dir, remove=False):
+        """Add every `<username>.gmm` pickle in model_dir to the store. Returns the usernames imported."""
+        imported = []
+        for filename in sorted(os.listdir(model_dir)):
+            if not filename.endswith('.gmm'):
+                continue
+            username = filename[:-len('.gmm')]
+            path = os.path.join(model_dir, filename)
+            try:
+                self.put(username, load_compact_model(path, dtype=STORE_DTYPE))
+            except Exception as e:
+                logger.warning(f"Could not import {filename}: {e}")
+                continue
+            imported.append(username)
+            if remove:
+                os.remove(path)
+        return imported
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Manage the packed speaker model store.")
+    parser.add_argument('--store-dir', default=os.path.join(base_dir, 'model', 'store'))
+    parser.add_argument('--model-dir', default=os.path.join(base_dir, 'model'))
+    parser.add_argument('--import-pickles', action='store_true', help="import <username>.gmm pickles from --model-dir")
+    parser.add_argument('--remove-pickles', action='store_true', help="delete each pickle once imported")
+    parser.add_argument('--compact', action='store_true', help="rewrite the store without tombstoned rows")
+    args = parser.parse_args()
+
+    store = ModelStore(args.store_dir)
+    if args.import_pickles:
+        imported = store.import_pickles(args.model_dir, remove=args.remove_pickles)
+        print(f"Imported {len(imported)} model(s): {', '.join(imported)}")
+    if args.compact:
+        print(f"Reclaimed {store.compact()} row(s)")
+    print(json.dumps(store.stats()))
@@ -0,0 +1,329 @@
+"""
+Incremental front-end for logins streamed while the user is still speaking.
+
+Audio arrives as int16 PCM chunks. Every chunk is turned into MFCC frames,
+frame energies (for the voice activity detector) and low-passed amplitude
+counts (for the deepfake histogram) as soon as enough samples are buffered,
+so none of the DSP is repeated when the next chunk arrives. Only the
+utterance-level steps - the VAD mask, which is relative to the loudest frame
+so far, and the per-utterance scaling in mfcc_to_features - are re-applied
+to the accumulated frames when features are requested. After finish(), the
+features equal extract_features() on the whole recording. With CMVN, rows
+that later audio can no longer change are reported by final_rows(), so their
+scores need not be computed again.
+"""
+import os
+import numpy as np
+import scipy.signal
+from voiceauth.frontend import get_frontend
+from voiceauth.feature_extraction import FEATURE_DTYPE, FEATURE_NORMALIZATION, mfcc_to_features
+from voiceauth.cmvn import lookahead_frames
+
+# Sequential test: standard errors between the mean score and the threshold
+# needed to decide early, minimum speech before deciding, and block length
+STREAM_CONFIDENCE_Z = float(os.environ.get('STREAM_CONFIDENCE_Z', 3.0))
+STREAM_MIN_SECONDS = float(os.environ.get('STREAM_MIN_SECONDS', 1.0))
+STREAM_BLOCK_SECONDS = float(os.environ.get('STREAM_BLOCK_SECONDS', 0.25))
+
+class StreamingHistogram:
+    """
+    Amplitude histogram of the zero-phase low-passed signal, built chunk by chunk.
+
+    filtfilt needs samples on both sides, so each chunk is filtered together
+    with `margin` seconds of context and only samples at least `margin` behind
+    the newest one are counted; the filter's impulse response has died out
+    well within that distance, so the counts match filtering the whole
+    recording at once (up to rounding noise in digital silence, which lands on
+    either side of the edge at 0). Counts are kept per `segment` samples,
+    which lets the caller drop the segments the VAD considers silence.
+    """
+
+    def __init__(self, frontend, segment, bins=256, value_range=(-1, 1), margin=0.05):
+        self.b, self.a = frontend.lowpass_b, frontend.lowpass_a
+        self.segment = segment
+        self.bins = bins
+        self.edges = np.histogram_bin_edges([], bins=bins, range=value_range)
+        self.margin = max(int(margin * frontend.rate), 3 * max(len(self.a), len(self.b)) + 1)
+        self._raw = np.empty(0, dtype=np.float64)
+        self._raw_start = 0
+        self._received = 0
+        self._settled = 0
+        self._counts = np.zeros((0, bins), dtype=np.int32)
+
+    def push(self, samples):
+        """Append float samples in [-1, 1] and count those whose filtered value is final."""
+        self._raw = np.concatenate([self._raw, np.asarray(samples, dtype=np.float64)])
+        self._received += len(samples)
+        self._settle(self._received - self.margin)
+
+    def finish(self):
+        """Count the remaining samples, filtered up to the end of the recording."""
+        self._settle(self._received)
+
+    def counts(self, segment_mask=None):
+        """Histogram over all counted samples, or only the segments where `segment_mask` is True."""
+        if segment_mask is None:
+            return self._counts.sum(axis=0)
+        segment_mask = np.asarray(segment_mask, dtype=bool)[:len(self._counts)]
+        return self._counts[:len(segment_mask)][segment_mask].sum(axis=0)
+
+    def _settle(self, end):
+        if end <= self._settled or len(self._raw) <= 3 * max(len(self.a), len(self.b)):
+            return
+        filtered = scipy.signal.filtfilt(self.b, self.a, self._raw)
+        values = filtered[self._settled - self._raw_start:end - self._raw_start]
+        positions = np.arange(self._settled, end) // self.segment
+
+        # Same binning as np.histogram: the last bin includes the upper edge
+        inside = (values >= self.edges[0]) & (values <= self.edges[-1])
+        bins = np.minimum(np.searchsorted(self.edges, values[inside], side='right') - 1, self.bins - 1)
+        first = positions[0]
+        segments = positions[-1] - first + 1
+        counts = np.bincount((positions[inside] - first) * self.bins + bins, minlength=segments * self.bins)
+
+        total = positions[-1] + 1
+        if total > len(self._counts):
+            self._counts = np.vstack([self._counts, np.zeros((total - len(self._counts), self.bins), dtype=np.int32)])
+        self._counts[first:total] += counts.reshape(segments, self.bins).astype(np.int32)
+        self._settled = end
+
+        # Keep `margin` samples of history for the next chunk's forward pass
+        keep_from = max(self._settled - self.margin, self._raw_start)
+        self._raw = self._raw[keep_from - self._raw_start:]
+        self._raw_start = keep_from
+
+class StreamingFeatureExtractor:
+    """
+    extract_features for audio that arrives in chunks.
+
+    MFCCs are computed once per complete frame, carrying the pre-emphasis
+    state and the frame overlap across chunk boundaries. With a `detector`,
+    frames are dropped the way VAD trimming drops them, but decided on the
+    MFCC frame grid so that the mask can move as louder speech arrives
+    without recomputing any frame.
+    """
+
+    def __init__(self, rate, detector=None, delta_order=1, delta_width=1, dtype=None, histogram=True,
+                 normalization=None):
+        """
+        :param rate: sample rate of the PCM stream (the rate of the speaker model)
+        :param detector: VoiceActivityDetector, or None to keep every frame
+        :param delta_order: 1 appends deltas, 2 also appends delta-deltas
+        :param delta_width: regression window half-width N for the deltas
+        :param dtype: floating point type of the features (default: FEATURE_DTYPE)
+        :param histogram: also accumulate the deepfake histogram
+        :param normalization: one of NORMALIZATION_MODES (default: FEATURE_NORMALIZATION)
+        """
+        self.rate = rate
+        self.detector = detector
+        self.delta_order = delta_order
+        self.delta_width = delta_width
+        self.normalization = FEATURE_NORMALIZATION if normalization is None else normalization
+        self.frontend = get_frontend(rate, dtype=FEATURE_DTYPE if dtype is None else np.dtype(dtype))
+        self.histogram = StreamingHistogram(self.frontend, self.frontend.frame_step) if histogram else None
+        self.num_samples = 0
+        self.finished = False
+        self._pending = np.empty(0, dtype=self.frontend.dtype)
+        self._previous = None
+        self._mfcc_blocks = []
+        self._energy_blocks = []
+        self._mfcc = None
+        self._energies = None
+
+    @property
+    def frame_seconds(self):
+        """Seconds between consecutive frames."""
+        return self.frontend.frame_step / self.rate
+
+    @property
+    def seconds(self):
+        """Length of the audio received so far."""
+        return self.num_samples / self.rate
+
+    @property
+    def num_frames(self):
+        return sum(len(block) for block in self._mfcc_blocks)
+
+    def push(self, pcm):
+        """
+        Append a chunk of int16 PCM.
+
+        :param pcm: 1D int16 array (or anything np.asarray turns into one)
+        :return: number of new MFCC frames
+        """
+        if self.finished:
+            raise ValueError("Cannot push audio after finish()")
+        pcm = np.asarray(pcm)
+        if len(pcm) == 0:
+            return 0
+        self.num_samples += len(pcm)
+        if self.histogram is not None:
+            self.histogram.push(pcm / 32768.0)
+
+        self._pending = np.concatenate([self._pending, pcm.astype(self.frontend.dtype)])
+        frame_len, frame_step = self.frontend.frame_len, self.frontend.frame_step
+        if len(self._pending) < frame_len:
+            return 0
+        count = (len(self._pending) - frame_len) // frame_step + 1
+        signal = self._pending[:(count - 1) * frame_step + frame_len]
+        self._add_frames(signal, self.frontend.preemphasis(signal, self._previous), count)
+
+        consumed = count * frame_step
+        self._previous = self._pending[consumed - 1]
+        self._pending = self._pending[consumed:]
+        return count
+
+    def finish(self):
+        """
+        Flush the last, zero-padded frame the way FeatureFrontend.frames pads
+        the end of an utterance.
+
+        :return: number of new MFCC frames
+        """
+        if self.finished:
+            return 0
+        self.finished = True
+        if self.histogram is not None:
+            self.histogram.finish()
+        frame_len, frame_step = self.frontend.frame_len, self.frontend.frame_step
+        # A whole recording of N samples has 1 + ceil((N - frame_len) / frame_step) frames
+        if self.num_frames and len(self._pending) <= frame_len - frame_step:
+            return 0
+        signal = np.zeros(frame_len, dtype=self.frontend.dtype)
+        emphasized = np.zeros(frame_len, dtype=self.frontend.dtype)
+        signal[:len(self._pending)] = self._pending
+        emphasized[:len(self._pending)] = self.frontend.preemphasis(self._pending, self._previous)
+        self._add_frames(signal, emphasized, 1)
+        self._pending = self._pending[:0]
+        return 1
+
+    def _add_frames(self, signal, emphasized, count):
+        frame_len, frame_step = self.frontend.frame_len, self.frontend.frame_step
+        frames = np.lib.stride_tricks.sliding_window_view(emphasized, frame_len)[::frame_step][:count]
+        self._mfcc_blocks.append(self.frontend.cepstra(frames))
+
+        frames = np.lib.stride_tricks.sliding_window_view(signal, frame_len)[::frame_step][:count]
+        power = np.mean(np.square(frames / 32768.0), axis=1)
+        self._energy_blocks.append(10 * np.log10(np.maximum(power, 1e-10)))
+        self._mfcc = self._energies = None
+
+    @property
+    def mfcc(self):
+        """(NUMFRAMES, numcep) raw MFCCs of every frame so far."""
+        if self._mfcc is None:
+            self._mfcc = np.concatenate(self._mfcc_blocks) if self._mfcc_blocks else \
+                np.empty((0, self.frontend.numcep), dtype=self.frontend.dtype)
+        return self._mfcc
+
+    @property
+    def energies(self):
+        """Per-frame power in dBFS."""
+        if self._energies is None:
+            self._energies = np.concatenate(self._energy_blocks) if self._energy_blocks else np.empty(0)
+        return self._energies
+
+    def speech_mask(self):
+        """Boolean mask of the frames kept as speech; all frames without a detector or without any speech."""
+        mask = np.zeros(self.num_frames, dtype=bool)
+        if self.detector is None:
+            mask[:] = True
+            return mask
+        starts, ends = self.detector.frame_regions(self.energies, self.frame_seconds)
+        for start, end in zip(starts, ends):
+            mask[start:end] = True
+        if not mask.any():
+            # Like VAD trimming, a recording without speech is used as it is
+            mask[:] = True
+        return mask
+
+    def features(self, mask=None):
+        """
+        Feature vectors of the speech so far, as extract_features returns them.
+
+        :param mask: speech mask from speech_mask(), if the caller already has one
+        :return: (frames, dims) array, or None before the first complete frame
+        """
+        if self.num_frames == 0:
+            return None
+        mask = self.speech_mask() if mask is None else mask
+        return mfcc_to_features(self.mfcc[mask], delta_order=self.delta_order, delta_width=self.delta_width,
+                                normalization=self.normalization)
+
+    def final_rows(self, num_rows):
+        """
+        How many leading rows of features() no later audio can change, given
+        `num_rows` rows now (if the speech mask of those frames stays put).
+
+        CMVN only looks back, so only the last rows, whose deltas still lack
+        their right context, and the CMVN look-ahead at the start are open;
+        the per-utterance RobustScaler makes every row depend on all audio.
+        """
+        if self.normalization == 'robust':
+            return 0
+        if num_rows < lookahead_frames(use_global_stats=self.normalization == 'cmvn_global'):
+            return 0
+        return max(num_rows - self.delta_order * self.delta_width, 0)
+
+    def histogram_counts(self, mask=None):
+        """Deepfake histogram counts over the speech frames so far."""
+        if self.histogram is None:
+            return None
+        mask = self.speech_mask() if mask is None else mask
+        if len(mask):
+            # Samples past the last complete frame belong with the last frame
+            segments = -(-self.num_samples // self.frontend.frame_step)
+            mask = np.r_[mask, np.repeat(mask[-1], max(segments - len(mask), 0))]
+        return self.histogram.counts(mask)
+
+class SequentialTest:
+    """
+    Early accept/reject decision on a growing utterance's mean log-likelihood.
+
+    The batch login accepts when the mean frame log-likelihood is above the
+    threshold. Consecutive 10 ms frames are strongly correlated, so the
+    uncertainty of that mean is estimated from the means of `block_seconds`
+    blocks instead: once `min_seconds` of speech are in, the login is accepted
+    when mean - z * se is above the threshold and rejected when mean + z * se
+    is below it. In between, the decision is left open.
+    """
+
+    def __init__(self, z=STREAM_CONFIDENCE_Z, min_seconds=STREAM_MIN_SECONDS, block_seconds=STREAM_BLOCK_SECONDS):
+        self.z = z
+        self.min_seconds = min_seconds
+        self.block_seconds = block_seconds
+
+    def decide(self, frame_scores, threshold, frame_seconds, final=False):
+        """
+        :param frame_scores: per-frame log-likelihoods of the speech so far
+        :param threshold: the user's acceptance threshold on the mean
+        :param frame_seconds: seconds between consecutive frames
+        :param final: the recording is complete; fall back to the batch rule
+        :return: dict with 'decision' ('accept', 'reject' or None), the mean
+                 score and its lower/upper confidence bounds
+        """
+        frame_scores = np.asarray(frame_scores, dtype=np.float64)
+        mean = float(frame_scores.mean()) if len(frame_scores) else float('-inf')
+        block = max(1, int(round(self.block_seconds / frame_seconds)))
+        blocks = len(frame_scores) // block
+
+        lower = upper = None
+        decision = None
+        if blocks >= 2:
+            block_means = frame_scores[:blocks * block].reshape(blocks, block).mean(axis=1)
+            half_width = self.z * float(np.std(block_means, ddof=1)) / np.sqrt(blocks)
+            lower, upper = mean - half_width, mean + half_width
+            if len(frame_scores) * frame_seconds >= self.min_seconds:
+                if lower > threshold:
+                    decision = 'accept'
+                elif upper < threshold:
+                    decision = 'reject'
+        if decision is None and final:
+            decision = 'accept' if mean > threshold else 'reject'
+
+        return {
+            "decision": decision,
+            "score": mean,
+            "lower": lower,
+            "upper": upper,
+            "speech_seconds": round(len(frame_scores) * frame_seconds, 3)
+        }
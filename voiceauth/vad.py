@@ -0,0 +1,117 @@
+"""
+Energy-based voice activity detection.
+
+Recordings from the browser typically start and end with silence and contain
+pauses between words. The detector finds the speech regions of a decoded
+utterance once, so feature extraction, the deepfake histogram and the ASR
+upload only ever see the audio that contains speech.
+"""
+import os
+import logging
+import numpy as np
+from voiceauth.audio import DecodedAudio
+
+logger = logging.getLogger(__name__)
+
+# Trim silence in enrollment, UBM training, login and chat (VAD_ENABLED=0 disables)
+VAD_ENABLED = os.environ.get('VAD_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+class VoiceActivityDetector:
+    """
+    Frame-energy speech detector.
+
+    A frame is speech when its power is within `top_db` of the loudest frame
+    and above the absolute `floor_db` (dBFS). Speech regions are widened by
+    `padding` seconds on each side so word onsets and releases survive, and
+    regions separated by less than `min_silence` seconds are merged.
+    """
+
+    def __init__(self, frame_length=0.02, top_db=35.0, floor_db=-65.0, padding=0.1, min_silence=0.3):
+        self.frame_length = frame_length
+        self.top_db = top_db
+        self.floor_db = floor_db
+        self.padding = padding
+        self.min_silence = min_silence
+
+    def frame_energies(self, samples, rate):
+        """Per-frame power in dBFS over non-overlapping frames; returns (energies, frame size in samples)."""
+        frame = max(1, int(round(self.frame_length * rate)))
+        num_frames = -(-len(samples) // frame)
+        padded = np.zeros(num_frames * frame, dtype=np.float32)
+        padded[:len(samples)] = samples
+        power = np.mean(np.square(padded.reshape(num_frames, frame)), axis=1)
+        return 10 * np.log10(np.maximum(power, 1e-10)), frame
+
+    def frame_regions(self, energies, frame_length):
+        """
+        Locate speech in a sequence of frame powers.
+
+        :param energies: per-frame power in dBFS
+        :param frame_length: seconds between consecutive frames, used to
+                             convert `padding` and `min_silence` to frames
+        :return: (starts, ends) arrays of frame indices, end exclusive
+        """
+        if len(energies) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        speech = (energies > energies.max() - self.top_db) & (energies > self.floor_db)
+
+        edges = np.flatnonzero(np.diff(np.r_[0, speech.astype(np.int8), 0]))
+        starts, ends = edges[::2], edges[1::2]
+        if len(starts) == 0:
+            return starts, ends
+
+        pad = int(round(self.padding / frame_length))
+        starts = np.maximum(starts - pad, 0)
+        ends = np.minimum(ends + pad, len(energies))
+
+        # Bridge short pauses (and regions that overlap after padding)
+        min_gap = int(round(self.min_silence / frame_length))
+        new_region = np.r_[True, starts[1:] - ends[:-1] >= min_gap]
+        return starts[new_region], ends[np.r_[new_region[1:], True]]
+
+    def regions(self, samples, rate):
+        """
+        Locate speech in a float signal in [-1, 1].
+
+        :param samples: 1D float audio signal
+        :param rate: sample rate of the signal
+        :return: list of (start, end) sample offsets, in order and non-overlapping
+        """
+        if len(samples) == 0:
+            return []
+        energies, frame = self.frame_energies(samples, rate)
+        starts, ends = self.frame_regions(energies, self.frame_length)
+        return [(int(s) * frame, min(int(e) * frame, len(samples))) for s, e in zip(starts, ends)]
+
+    def trim(self, audio):
+        """
+        Drop non-speech from a DecodedAudio.
+
+        :param audio: DecodedAudio utterance
+        :return: (DecodedAudio with only the speech regions, stats dict). If no
+                 speech is found, or all of it is speech, the input is returned
+                 unchanged.
+        """
+        total = len(audio)
+        regions = self.regions(audio.samples, audio.rate)
+        kept = sum(end - start for start, end in regions)
+
+        if not regions or kept == total:
+            speech = audio
+            kept = total
+        else:
+            speech = DecodedAudio(np.concatenate([audio.samples[start:end] for start, end in regions]), audio.rate)
+
+        stats = {
+            "kept_fraction": round(kept / total, 4) if total else 1.0,
+            "speech_seconds": round(kept / audio.rate, 3),
+            "total_seconds": round(total / audio.rate, 3),
+            "regions": len(regions)
+        }
+        return speech, stats
+
+default_detector = VoiceActivityDetector(top_db=float(os.environ.get('VAD_TOP_DB', 35.0)))
+
+def trim_silence(audio, detector=None):
+    """Trim `audio` with the default detector (or `detector`); returns (speech, stats)."""
+    return (detector or default_detector).trim(audio)
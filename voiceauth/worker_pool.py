@@ -0,0 +1,89 @@
+"""
+Long-lived process pool shared by feature extraction in the API and the
+training scripts. Workers are forked from a forkserver that preloads only
+the lightweight feature-extraction modules.
+"""
+import os
+import atexit
+import signal
+import logging
+import threading
+import multiprocessing
+from voiceauth import logging_setup
+
+logger = logging.getLogger(__name__)
+
+# Modules imported once by the forkserver so forked workers start warm
+# (feature_extraction only imports sklearn when it runs). '__main__' is left
+# out on purpose, but each worker still runs the launching script as
+# __mp_main__, so scripts must keep their side effects behind a __name__ check
+PRELOAD_MODULES = ['voiceauth.worker_pool', 'voiceauth.logging_setup', 'voiceauth.audio', 'voiceauth.vad',
+                   'voiceauth.feature_extraction', 'librosa', 'sklearn.feature_selection', 'sklearn.preprocessing']
+
+_pool = None
+_pool_pid = None
+_pool_log_queue = None
+_pool_lock = threading.Lock()
+
+def pool_size():
+    """Number of worker processes (FEATURE_POOL_SIZE, default: one per CPU)."""
+    size = int(os.environ.get('FEATURE_POOL_SIZE', 0))
+    return size if size > 0 else (os.cpu_count() or 1)
+
+def start_method():
+    """Start method for workers (FEATURE_POOL_START_METHOD, default: forkserver when available)."""
+    method = os.environ.get('FEATURE_POOL_START_METHOD')
+    if method:
+        return method
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return 'forkserver'
+    return 'spawn'
+
+def _init_worker(log_queue):
+    """Initializer run once in every worker process."""
+    # Ctrl+C is handled by the parent, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Records go to the parent, which alone writes the log file
+    logging_setup.configure_worker_logging(log_queue)
+
+    # Parallelism comes from the pool; keep BLAS single-threaded per worker
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+def get_pool():
+    """Return the shared pool, starting it on first use (or after a fork)."""
+    global _pool, _pool_pid, _pool_log_queue
+    with _pool_lock:
+        # A pool inherited across fork (e.g. gunicorn workers) belongs to the parent
+        if _pool is None or _pool_pid != os.getpid():
+            ctx = multiprocessing.get_context(start_method())
+            if ctx.get_start_method() == 'forkserver':
+                ctx.set_forkserver_preload(PRELOAD_MODULES)
+            size = pool_size()
+            _pool_log_queue = logging_setup.worker_log_queue(ctx)
+            _pool = ctx.Pool(processes=size, initializer=_init_worker, initargs=(_pool_log_queue,))
+            _pool_pid = os.getpid()
+            logger.info(f"Started feature extraction pool with {size} {ctx.get_start_method()} workers")
+        return _pool
+
+def imap(func, iterable, chunksize=1):
+    """Lazily map `func` over `iterable` on the shared pool, preserving order."""
+    return get_pool().imap(func, iterable, chunksize)
+
+def shutdown_pool():
+    """Terminate the shared pool, if this process started one."""
+    global _pool, _pool_pid, _pool_log_queue
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.terminate()
+            _pool.join()
+            logging_setup.close_worker_log_queue(_pool_log_queue)
+        _pool = None
+        _pool_pid = None
+        _pool_log_queue = None
+
+atexit.register(shutdown_pool)